@@ -0,0 +1,134 @@
+"""
+Activity detail enrichment: laps, splits and time in heart rate zones.
+
+The activity list only carries summary fields; laps and HR zones need two
+detail calls per activity (get_activity_splits, get_activity_hr_in_timezones).
+A finished activity's details never change, so the properties derived from
+them are kept permanently per activityId in
+`SYNC_STATE_DIR/activity-details.sqlite3` and each activity is fetched only
+once. Missing activities are fetched on a bounded thread pool
+(GARMIN_ENRICH_WORKERS, default 4), so enriching a long history is a
+one-time, parallel cost. Enrichment is off unless GARMIN_ENRICH_ACTIVITIES
+is set, because the activities database needs the extra properties.
+"""
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sync_state import state_path
+
+ENRICH_WORKERS = 4
+HR_ZONES = 5
+# Notion rich text is limited to 2000 characters per block
+MAX_TEXT_LENGTH = 2000
+
+# Derived properties and their Notion types
+DETAIL_FIELD_TYPES = {
+    "Laps": "number",
+    "Splits": "rich_text",
+    **{f"HR Zone {zone} (min)": "number" for zone in range(1, HR_ZONES + 1)},
+}
+
+
+def enrichment_enabled():
+    return os.getenv("GARMIN_ENRICH_ACTIVITIES", "").lower() in ("1", "true", "yes")
+
+
+def format_lap(lap):
+    distance_km = (lap.get('distance') or 0) / 1000
+    speed = lap.get('averageSpeed') or 0
+    if distance_km and speed:
+        pace = 1000 / 60 / speed
+        return f"{distance_km:.2f} km @ {int(pace)}:{int((pace % 1) * 60):02d}"
+    minutes = (lap.get('duration') or 0) / 60
+    return f"{int(minutes)}:{int((minutes % 1) * 60):02d} min"
+
+
+def detail_values(splits, hr_zones):
+    # Notion property values derived from the two detail responses
+    laps = (splits or {}).get('lapDTOs') or []
+    values = {
+        "Laps": len(laps),
+        "Splits": ", ".join(format_lap(lap) for lap in laps)[:MAX_TEXT_LENGTH],
+    }
+    seconds = {zone.get('zoneNumber'): zone.get('secsInZone') or 0 for zone in hr_zones or []}
+    for zone in range(1, HR_ZONES + 1):
+        values[f"HR Zone {zone} (min)"] = round(seconds.get(zone, 0) / 60, 1)
+    return values
+
+
+class ActivityDetails:
+    """activityId -> derived detail properties, kept forever."""
+
+    def __init__(self, path=None, workers=None):
+        path = path or os.getenv("ACTIVITY_DETAILS_PATH") or state_path("activity-details.sqlite3")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.workers = int(workers or os.getenv("GARMIN_ENRICH_WORKERS", ENRICH_WORKERS))
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS details (
+                    activity_id INTEGER PRIMARY KEY,
+                    fields TEXT NOT NULL,
+                    fetched_at TEXT NOT NULL
+                )
+                """
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def cached(self, activity_ids):
+        if not activity_ids:
+            return {}
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT activity_id, fields FROM details WHERE activity_id IN ({', '.join('?' for _ in activity_ids)})",
+                list(activity_ids),
+            ).fetchall()
+        return {activity_id: json.loads(fields) for activity_id, fields in rows}
+
+    def store(self, activity_id, fields):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO details (activity_id, fields, fetched_at) VALUES (?, ?, ?)",
+                (activity_id, json.dumps(fields, sort_keys=True), datetime.now(timezone.utc).isoformat()),
+            )
+
+    def fetch(self, garmin, activity_id):
+        fields = detail_values(
+            garmin.get_activity_splits(activity_id),
+            garmin.get_activity_hr_in_timezones(activity_id),
+        )
+        self.store(activity_id, fields)
+        return fields
+
+    def enrich(self, garmin, activities):
+        # {activityId: detail properties} for a batch, fetching only the activities not seen before
+        activity_ids = [a.activityId for a in activities if a.activityId]
+        details = self.cached(activity_ids)
+        missing = [activity_id for activity_id in activity_ids if activity_id not in details]
+        if not missing:
+            return details
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {activity_id: pool.submit(self.fetch, garmin, activity_id) for activity_id in missing}
+        for activity_id, future in futures.items():
+            try:
+                details[activity_id] = future.result()
+            except Exception as e:
+                # Left out of the cache, so the next run tries again
+                print(f"⚠️ Could not fetch details of activity {activity_id}: {e}")
+        return details
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
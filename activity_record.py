@@ -0,0 +1,65 @@
+"""
+Compact activity records for the activities sync.
+
+A Garmin activity summary carries well over 100 keys, several of them nested
+objects, of which the sync reads 18. Every page is projected into
+ActivityRecord objects right after it is fetched, so a batch holds only
+those fields and the raw dicts are freed straight away. Each record is a
+`__slots__` object without a per-instance dict. Missing keys get the
+defaults the field mapping used to pass to dict.get, so the Notion values
+and their ledger hashes stay the same.
+"""
+import sys
+
+# Garmin key -> value used when the activity does not have it
+ACTIVITY_RECORD_FIELDS = {
+    "activityId": None,
+    "activityName": "Unnamed Activity",
+    "typeKey": "Unknown",
+    "startTimeGMT": None,
+    "startTimeLocal": None,
+    "distance": 0,
+    "duration": 0,
+    "calories": 0,
+    "averageSpeed": 0,
+    "avgPower": 0,
+    "maxPower": 0,
+    "trainingEffectLabel": "Unknown",
+    "aerobicTrainingEffect": 0,
+    "aerobicTrainingEffectMessage": "Unknown",
+    "anaerobicTrainingEffect": 0,
+    "anaerobicTrainingEffectMessage": "Unknown",
+    "pr": False,
+    "favorite": False,
+}
+
+# A handful of distinct values repeated across the whole history, shared instead of copied per record
+INTERNED_FIELDS = ("typeKey", "trainingEffectLabel", "aerobicTrainingEffectMessage", "anaerobicTrainingEffectMessage")
+
+
+class ActivityRecord:
+    """The fields of a Garmin activity that the sync uses, as attributes named like the Garmin keys."""
+
+    __slots__ = tuple(ACTIVITY_RECORD_FIELDS)
+
+    @classmethod
+    def from_garmin(cls, activity):
+        record = cls.__new__(cls)
+        for name, default in ACTIVITY_RECORD_FIELDS.items():
+            if name != "typeKey":
+                setattr(record, name, activity.get(name, default))
+        # typeKey is the only field nested in the payload (activityType.typeKey)
+        record.typeKey = (activity.get('activityType') or {}).get('typeKey', ACTIVITY_RECORD_FIELDS["typeKey"])
+        for name in INTERNED_FIELDS:
+            value = getattr(record, name)
+            if isinstance(value, str):
+                setattr(record, name, sys.intern(value))
+        return record
+
+    def __repr__(self):
+        return f"ActivityRecord({self.activityId}, {self.startTimeGMT!r}, {self.typeKey!r})"
+
+
+def project_activities(activities):
+    # One page of raw Garmin activities -> records; the caller drops the raw page
+    return [ActivityRecord.from_garmin(activity) for activity in activities]
@@ -0,0 +1,203 @@
+"""
+Local analytics store, kept next to the Notion databases.
+
+Every sync also writes its records as plain rows into a SQLite database
+(`SYNC_STATE_DIR/analytics.sqlite3`, or ANALYTICS_DB_PATH): activities,
+daily steps, sleep and personal records, one table each, keyed like the
+ledger so reruns replace rows instead of duplicating them. The days each
+activity, steps or sleep write touched are remembered until the rollups (rollups.py) have been
+recomputed for them. Rolling statistics
+(7-day resting HR, weekly distance, steps and calorie balance) are computed
+over the whole table with SQLite window functions, so no API calls are
+needed for them; only the rows inside the requested range and the window
+before it are read. The tables can be read directly, e.g. with
+pandas.read_sql, for further analysis.
+
+Usage: python analytics_store.py [days]
+    Prints the rolling statistics for the last `days` days (default 14).
+"""
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date, timedelta
+
+from sync_state import state_path
+
+# Rolling statistics cover this many days, ending on the day itself
+ROLLING_WINDOW_DAYS = 7
+# A rolling resting HR needs this many nights in the window to be published
+MIN_RESTING_HR_NIGHTS = 5
+
+TABLES = {
+    "activities": (
+        ("activity_id", "INTEGER PRIMARY KEY"),
+        ("date", "TEXT NOT NULL"),
+        ("start_time", "TEXT"),
+        ("activity_type", "TEXT"),
+        ("subactivity_type", "TEXT"),
+        ("name", "TEXT"),
+        ("distance_km", "REAL"),
+        ("duration_min", "REAL"),
+        ("calories", "REAL"),
+        ("avg_power", "REAL"),
+        ("aerobic_effect", "REAL"),
+        ("anaerobic_effect", "REAL"),
+    ),
+    "daily_steps": (
+        ("date", "TEXT PRIMARY KEY"),
+        ("steps", "INTEGER"),
+        ("step_goal", "INTEGER"),
+        ("distance_km", "REAL"),
+    ),
+    "sleep": (
+        ("date", "TEXT PRIMARY KEY"),
+        ("total_sleep_h", "REAL"),
+        ("deep_sleep_h", "REAL"),
+        ("light_sleep_h", "REAL"),
+        ("rem_sleep_h", "REAL"),
+        ("awake_h", "REAL"),
+        ("sleep_score", "INTEGER"),
+        ("resting_hr", "INTEGER"),
+        ("hrv_ms", "INTEGER"),
+        ("night_stress", "REAL"),
+        ("total_kcal", "REAL"),
+        ("consumed_kcal", "REAL"),
+        ("active_kcal", "REAL"),
+        ("calorie_balance", "REAL"),
+        ("hydration_ml", "REAL"),
+        ("weight_kg", "REAL"),
+    ),
+    "personal_records": (
+        ("record", "TEXT NOT NULL"),
+        ("date", "TEXT NOT NULL"),
+        ("activity_type", "TEXT"),
+        ("value", "TEXT"),
+        ("pace", "TEXT"),
+        ("", "PRIMARY KEY (record, date)"),
+    ),
+}
+
+# Tables whose rows feed the weekly and monthly rollups; only they mark days as touched
+ROLLUP_TABLES = {"activities", "daily_steps", "sleep"}
+
+# One row per day that has any data; the window is a date range, so missing days don't stretch it.
+# Parameters: first day read (the window before the range), last day, window length - 1, range start and end.
+ROLLING_STATS_SQL = """
+WITH bounds AS (SELECT ? AS first_day, ? AS last_day),
+days AS (
+    SELECT date FROM sleep, bounds WHERE date BETWEEN first_day AND last_day
+    UNION SELECT date FROM daily_steps, bounds WHERE date BETWEEN first_day AND last_day
+    UNION SELECT date FROM activities, bounds WHERE date BETWEEN first_day AND last_day
+),
+distance AS (
+    SELECT date, SUM(distance_km) AS distance_km FROM activities, bounds
+    WHERE date BETWEEN first_day AND last_day GROUP BY date
+),
+daily AS (
+    SELECT days.date, sleep.resting_hr, sleep.calorie_balance, daily_steps.steps,
+           COALESCE(distance.distance_km, 0.0) AS distance_km
+    FROM days
+    LEFT JOIN sleep ON sleep.date = days.date
+    LEFT JOIN daily_steps ON daily_steps.date = days.date
+    LEFT JOIN distance ON distance.date = days.date
+),
+rolling AS (
+    SELECT date,
+           AVG(resting_hr) OVER window_days AS resting_hr_avg,
+           COUNT(resting_hr) OVER window_days AS resting_hr_nights,
+           SUM(distance_km) OVER window_days AS distance_km_sum,
+           SUM(steps) OVER window_days AS steps_sum,
+           AVG(calorie_balance) OVER window_days AS calorie_balance_avg
+    FROM daily
+    WINDOW window_days AS (ORDER BY julianday(date) RANGE BETWEEN ? PRECEDING AND CURRENT ROW)
+)
+SELECT * FROM rolling WHERE date BETWEEN ? AND ? ORDER BY date
+"""
+
+
+class AnalyticsStore:
+    """Synced Garmin records as SQLite rows, one table per kind."""
+
+    def __init__(self, path=None):
+        path = path or os.getenv("ANALYTICS_DB_PATH") or state_path("analytics.sqlite3")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The syncs run on several threads in sync_runner, so the connection is shared
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            for table, columns in TABLES.items():
+                definition = ", ".join(f"{name} {kind}".strip() for name, kind in columns)
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS activities_date ON activities (date)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS touched_days (date TEXT PRIMARY KEY)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, table, rows):
+        # Insert or replace rows (dicts keyed by column name) in one transaction
+        columns = [name for name, _ in TABLES[table] if name]
+        statement = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        with self.lock, self.conn:
+            self.conn.executemany(statement, [tuple(row.get(column) for column in columns) for row in rows])
+            if table in ROLLUP_TABLES:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO touched_days (date) VALUES (?)",
+                    {(row["date"],) for row in rows if row.get("date")},
+                )
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.conn.execute(sql, parameters).fetchall()
+
+    def touched_days(self):
+        # Days written since the rollups were last brought up to date
+        return [date for (date,) in self.query("SELECT date FROM touched_days ORDER BY date")]
+
+    def clear_touched(self, days):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM touched_days WHERE date = ?", [(day,) for day in days])
+
+    def rolling_stats(self, start, end, window_days=ROLLING_WINDOW_DAYS):
+        # {date: stats} for the days with data between start and end (ISO dates, inclusive)
+        first_day = (date.fromisoformat(start) - timedelta(days=window_days - 1)).isoformat()
+        with self.lock:
+            cursor = self.conn.execute(ROLLING_STATS_SQL, (first_day, end, window_days - 1, start, end))
+            columns = [column[0] for column in cursor.description]
+            return {row[0]: dict(zip(columns[1:], row[1:])) for row in cursor.fetchall()}
+
+    def resting_hr_avg(self, day, window_days=ROLLING_WINDOW_DAYS, min_nights=MIN_RESTING_HR_NIGHTS):
+        # Average resting HR over the window ending on day, None with fewer than min_nights in the store
+        stats = self.rolling_stats(day, day, window_days).get(day, {})
+        if (stats.get("resting_hr_nights") or 0) < min_nights:
+            return None
+        return round(stats["resting_hr_avg"], 1)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 14
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    with AnalyticsStore() as store:
+        stats = store.rolling_stats(start.isoformat(), end.isoformat())
+    print(f"📈 Rolling {ROLLING_WINDOW_DAYS}-day statistics")
+    print(f"{'date':<12}{'resting HR':>12}{'distance km':>13}{'steps':>10}{'kcal balance':>14}")
+    for day, row in stats.items():
+        values = [row["resting_hr_avg"], row["distance_km_sum"], row["steps_sum"], row["calorie_balance_avg"]]
+        cells = ["-" if value is None else f"{value:.1f}" if isinstance(value, float) else str(value) for value in values]
+        print(f"{day:<12}{cells[0]:>12}{cells[1]:>13}{cells[2]:>10}{cells[3]:>14}")
+
+
+if __name__ == '__main__':
+    main()
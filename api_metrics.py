@@ -0,0 +1,189 @@
+"""
+Per-endpoint API call instrumentation.
+
+instrument_garmin() and instrument_notion() wrap the client methods the sync
+scripts use; NotionWriter records its own requests. Every HTTP attempt is
+counted per endpoint with its latency, response size, retries, errors and
+429 responses. Latencies go into a log-scale histogram (percentiles within
+5%), so a long-running daemon keeps a fixed amount of state per endpoint.
+write_summary() dumps the totals, with latency percentiles, as JSON for monitoring to collect (SYNC_METRICS_FILE, default
+`SYNC_STATE_DIR/run-summary.json`).
+"""
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sync_state import state_path
+
+# Stats of the call in progress, so response hooks can attribute bytes and 429s
+_current_call = contextvars.ContextVar("current_api_call", default=None)
+
+
+# Latency histogram buckets grow by 5% from 0.1 ms; a few hundred cover any real request
+LATENCY_BUCKET_MIN = 0.0001
+LATENCY_BUCKET_RATIO = 1.05
+
+
+def latency_bucket(seconds):
+    if seconds <= LATENCY_BUCKET_MIN:
+        return 0
+    return math.ceil(math.log(seconds / LATENCY_BUCKET_MIN) / math.log(LATENCY_BUCKET_RATIO))
+
+
+def percentile(buckets, fraction, maximum):
+    # Upper bound of the bucket holding the value at `fraction`, never above the largest value seen
+    count = sum(buckets.values())
+    if not count:
+        return None
+    rank = min(count, max(1, round(fraction * count)))
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen >= rank:
+            return min(maximum, LATENCY_BUCKET_MIN * LATENCY_BUCKET_RATIO ** bucket)
+    return maximum
+
+
+class ApiMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.started_at = datetime.now(timezone.utc)
+
+    def _endpoint(self, name):
+        return self.endpoints.setdefault(name, {
+            "count": 0, "errors": 0, "retries": 0, "rate_limited": 0, "bytes": 0, "latencies": {}, "max_latency": 0.0,
+        })
+
+    def record(self, name, seconds, response_bytes=0, failed=False, retry=False, rate_limited=False):
+        with self.lock:
+            stats = self._endpoint(name)
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["retries"] += int(retry)
+            stats["rate_limited"] += int(rate_limited)
+            stats["bytes"] += response_bytes
+            bucket = latency_bucket(seconds)
+            stats["latencies"][bucket] = stats["latencies"].get(bucket, 0) + 1
+            stats["max_latency"] = max(stats["max_latency"], seconds)
+
+    def count_retry(self, name):
+        # A call that is about to be repeated after a retryable error
+        with self.lock:
+            self._endpoint(name)["retries"] += 1
+
+    @contextmanager
+    def call(self, name, retry=False):
+        # Time one request; response hooks fill in bytes and the status code
+        current = {"bytes": 0, "status": None}
+        token = _current_call.set(current)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield current
+        except Exception as e:
+            failed = True
+            current["status"] = current["status"] or getattr(e, "status", None)
+            raise
+        finally:
+            _current_call.reset(token)
+            self.record(name, time.perf_counter() - started, current["bytes"], failed, retry, current["status"] == 429)
+
+    def wrap(self, name, method):
+        def wrapper(*args, **kwargs):
+            with self.call(name):
+                return method(*args, **kwargs)
+        wrapper.__name__ = getattr(method, "__name__", name)
+        wrapper.__doc__ = getattr(method, "__doc__", None)
+        return wrapper
+
+    def summary(self, extra=None):
+        with self.lock:
+            endpoints = {}
+            for name, stats in sorted(self.endpoints.items()):
+                endpoints[name] = {
+                    key: value for key, value in stats.items() if key not in ("latencies", "max_latency")
+                }
+                percentiles = {
+                    label: percentile(stats["latencies"], fraction, stats["max_latency"])
+                    for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+                }
+                # None for endpoints with retries counted but no timed calls, e.g. uninstrumented ones
+                endpoints[name]["latency_ms"] = {
+                    label: None if value is None else round(value * 1000, 1) for label, value in percentiles.items()
+                }
+        totals = {
+            key: sum(stats[key] for stats in endpoints.values())
+            for key in ("count", "errors", "retries", "rate_limited", "bytes")
+        }
+        finished_at = datetime.now(timezone.utc)
+        summary = {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": finished_at.isoformat(),
+            "duration_s": round((finished_at - self.started_at).total_seconds(), 3),
+            "totals": totals,
+            "endpoints": endpoints,
+        }
+        summary.update(extra or {})
+        return summary
+
+    def write_summary(self, path=None, extra=None):
+        path = path or os.getenv("SYNC_METRICS_FILE") or state_path("run-summary.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        summary = self.summary(extra)
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        return path, summary
+
+
+# Shared by every client in the process
+METRICS = ApiMetrics()
+
+
+def _count_response(status, size):
+    current = _current_call.get()
+    if current is not None:
+        current["bytes"] += size
+        current["status"] = status
+
+
+def instrument_garmin(garmin, metrics=METRICS):
+    # Wrap the Garmin data getters and count raw response bytes on garth's session.
+    # Proxies (e.g. the response cache) are unwrapped so only network calls are counted.
+    outer = garmin
+    while hasattr(garmin, "wrapped"):
+        garmin = garmin.wrapped
+
+    def on_response(response, *args, **kwargs):
+        _count_response(response.status_code, len(response.content or b""))
+
+    garmin.garth.sess.hooks["response"].append(on_response)
+    for name in dir(type(garmin)):
+        if name.startswith(("get_", "download_")) and callable(getattr(type(garmin), name)):
+            setattr(garmin, name, metrics.wrap(f"garmin.{name}", getattr(garmin, name)))
+    return outer
+
+
+def instrument_notion(client, metrics=METRICS):
+    # Wrap the Notion endpoints the sync scripts call on the synchronous client
+    def on_response(response):
+        response.read()
+        _count_response(response.status_code, len(response.content))
+
+    client.client.event_hooks["response"].append(on_response)
+    for endpoint, method in (("databases", "query"), ("databases", "retrieve"),
+                             ("pages", "create"), ("pages", "update")):
+        target = getattr(client, endpoint)
+        setattr(target, method, metrics.wrap(f"notion.{endpoint}.{method}", getattr(target, method)))
+    return client
+
+
+async def count_async_response(response):
+    # httpx response hook for the AsyncClient used by NotionWriter
+    await response.aread()
+    _count_response(response.status_code, len(response.content))
@@ -0,0 +1,393 @@
+"""
+Local stand-ins for Garmin Connect and the Notion API.
+
+Both servers serve generated but realistically shaped payloads over HTTP on
+127.0.0.1, sleep for a configurable latency on every request and count the
+requests they receive per endpoint. The Notion server keeps created pages in
+memory and evaluates the subset of database filters the sync scripts use, so
+reruns see the pages the previous run created.
+"""
+import io
+import json
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ACTIVITY_TYPES = ["running", "cycling", "indoor_cycling", "walking", "strength_training", "yoga", "treadmill_running"]
+TRAINING_MESSAGES = ["NO_BENEFIT", "MINOR_AEROBIC_BENEFIT", "MAINTAINING_AEROBIC_FITNESS", "IMPROVING_VO2_MAX", "HIGHLY_IMPROVING_LACTATE_THRESHOLD"]
+
+
+class GarminDataset:
+    """Deterministic activity, steps, sleep and PR history ending yesterday."""
+
+    def __init__(self, activities=100, days=30, seed=1):
+        rng = random.Random(seed)
+        self.end = date.today() - timedelta(days=1)
+        self.days = [self.end - timedelta(days=offset) for offset in range(days)]
+
+        # Newest first, like activitylist-service
+        start = datetime.combine(self.end, datetime.min.time()) + timedelta(hours=18)
+        self.activities = []
+        for index in range(activities):
+            started = start - timedelta(hours=19 * index)
+            type_key = rng.choice(ACTIVITY_TYPES)
+            distance = rng.uniform(2000, 40000)
+            duration = rng.uniform(900, 7200)
+            activity = {
+                "activityId": 10_000_000 + activities - index,
+                "activityName": f"{type_key.replace('_', ' ').title()} {index}",
+                "startTimeGMT": started.strftime("%Y-%m-%d %H:%M:%S"),
+                "startTimeLocal": started.strftime("%Y-%m-%d %H:%M:%S"),
+                "activityType": {"typeId": ACTIVITY_TYPES.index(type_key) + 1, "typeKey": type_key, "parentTypeId": 17},
+                "distance": distance,
+                "duration": duration,
+                "elapsedDuration": duration + rng.uniform(0, 300),
+                "movingDuration": duration - rng.uniform(0, 120),
+                "averageSpeed": distance / duration,
+                "maxSpeed": distance / duration * 1.4,
+                "calories": rng.uniform(100, 1500),
+                "averageHR": rng.uniform(110, 165),
+                "maxHR": rng.uniform(165, 190),
+                "avgPower": rng.uniform(0, 260),
+                "maxPower": rng.uniform(260, 800),
+                "aerobicTrainingEffect": rng.uniform(0, 5),
+                "anaerobicTrainingEffect": rng.uniform(0, 5),
+                "aerobicTrainingEffectMessage": rng.choice(TRAINING_MESSAGES),
+                "anaerobicTrainingEffectMessage": rng.choice(TRAINING_MESSAGES),
+                "trainingEffectLabel": rng.choice(["AEROBIC_BASE", "TEMPO", "THRESHOLD", "VO2MAX", "RECOVERY"]),
+                "pr": rng.random() < 0.05,
+                "favorite": rng.random() < 0.1,
+                "elevationGain": rng.uniform(0, 800),
+                "elevationLoss": rng.uniform(0, 800),
+                "steps": rng.randint(0, 20000),
+                # Real payloads carry many more keys than the sync uses
+                "summarizedDiveInfo": {"summarizedDiveGases": []},
+                "splitSummaries": [{"noOfSplits": 1, "splitType": "INTERVAL_ACTIVE", "duration": duration}],
+                "userRoles": ["SCOPE_GOLF_API_READ", "SCOPE_ATP_READ", "SCOPE_DIVE_API_WRITE"],
+                "description": None,
+                "deviceId": 3_400_000_000,
+            }
+            self.activities.append(activity)
+
+        self.steps = {
+            day.isoformat(): {
+                "calendarDate": day.isoformat(),
+                "totalSteps": rng.randint(2000, 25000),
+                "totalDistance": rng.randint(1500, 20000),
+                "stepGoal": 8000,
+            }
+            for day in self.days
+        }
+        self.sleep = {day.isoformat(): self._sleep(rng, day) for day in self.days}
+        self.records = [
+            {"typeId": type_id, "activityType": "running" if type_id < 9 else None,
+             "value": value, "prStartTimeGmtFormatted": (self.end - timedelta(days=rng.randint(0, 365))).isoformat()}
+            for type_id, value in [(1, 240.0), (2, 390.0), (3, 1260.0), (4, 2700.0), (7, 21500.0), (8, 90000.0),
+                                   (9, 1450.0), (10, 230.0), (12, 31000.0), (13, 120000.0), (14, 410000.0), (15, 42.0)]
+        ]
+
+    @staticmethod
+    def _sleep(rng, day):
+        start = datetime.combine(day, datetime.min.time()) - timedelta(hours=rng.uniform(1, 3))
+        deep, light, rem, awake = (rng.randint(3000, 7000), rng.randint(10000, 16000),
+                                   rng.randint(3000, 8000), rng.randint(300, 2400))
+        end = start + timedelta(seconds=deep + light + rem + awake)
+        return {
+            "dailySleepDTO": {
+                "calendarDate": day.isoformat(),
+                "sleepStartTimestampGMT": int(start.timestamp() * 1000),
+                "sleepEndTimestampGMT": int(end.timestamp() * 1000),
+                "deepSleepSeconds": deep,
+                "lightSleepSeconds": light,
+                "remSleepSeconds": rem,
+                "awakeSleepSeconds": awake,
+                "avgSleepStress": rng.uniform(10, 30),
+                "sleepScores": {"overall": {"value": rng.randint(50, 95)}},
+            },
+            "restingHeartRate": rng.randint(45, 60),
+            "avgOvernightHrv": rng.randint(35, 80),
+            "hrvStatus": rng.choice(["BALANCED", "UNBALANCED", "LOW"]),
+            "sleepMovement": [{"startGMT": start.isoformat(), "activityLevel": rng.random()} for _ in range(60)],
+        }
+
+
+def fit_file(seconds, seed=1, start=1_000_000_000):
+    """
+    A FIT activity with one `record` message per second: every other sample
+    uses a compressed timestamp header, as devices do. The CRCs are zero.
+    """
+    rng = random.Random(seed)
+    body = bytearray()
+    # file_id (global 0): type, time_created; then record (global 20) with and without a timestamp
+    body += bytes([0x40, 0, 0]) + struct.pack("<HB", 0, 2) + bytes([0, 1, 0x00, 4, 4, 0x86])
+    body += bytes([0x00, 4]) + struct.pack("<I", start)
+    record_fields = [(3, 1, 0x02), (6, 2, 0x84), (7, 2, 0x84), (2, 2, 0x84)]
+    body += bytes([0x41, 0, 0]) + struct.pack("<HB", 20, 5) + bytes([253, 4, 0x86]) + b"".join(bytes(f) for f in record_fields)
+    body += bytes([0x42, 0, 0]) + struct.pack("<HB", 20, 4) + b"".join(bytes(f) for f in record_fields)
+    for second in range(seconds):
+        sample = struct.pack("<BHHH", rng.randint(110, 175), int(rng.uniform(2.5, 4.5) * 1000),
+                             rng.randint(150, 320), int((rng.uniform(20, 60) + 500) * 5))
+        timestamp = start + second
+        if second % 2:
+            body += bytes([0x80 | (2 << 5) | (timestamp & 0x1F)]) + sample
+        else:
+            body += bytes([0x01]) + struct.pack("<I", timestamp) + sample
+    header = struct.pack("<BBHI4sH", 14, 0x20, 2132, len(body), b".FIT", 0)
+    return header + bytes(body) + b"\x00\x00"
+
+
+def fit_download(activity_id, seconds):
+    # Garmin serves original uploads zipped
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(f"{activity_id}_ACTIVITY.fit", fit_file(seconds, seed=activity_id))
+    return buffer.getvalue()
+
+
+class CountingServer:
+    """
+    Threaded HTTP server that adds latency and counts requests per endpoint.
+    With `failure_rate`, that share of requests is answered with a 503 instead.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=1):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.failures = Counter()
+        self.lock = threading.Lock()
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; avoid delayed-ACK stalls
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                parts = urlsplit(self.path)
+                time.sleep(outer.latency)
+                with outer.lock:
+                    fail = outer.failure_rate and outer.rng.random() < outer.failure_rate
+                if fail:
+                    status, payload = 503, {"object": "error", "status": 503, "code": "service_unavailable", "message": "Injected failure"}
+                    with outer.lock:
+                        outer.failures[parts.path] += 1
+                else:
+                    status, endpoint, payload = outer.route(self.command, parts.path, parse_qs(parts.query), body)
+                    with outer.lock:
+                        outer.calls[endpoint] += 1
+                data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = _handle
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_counts(self):
+        with self.lock:
+            self.calls.clear()
+            self.failures.clear()
+
+    def route(self, method, path, query, body):
+        raise NotImplementedError
+
+
+class FakeGarminServer(CountingServer):
+    """Serves the connectapi endpoints the sync scripts call."""
+
+    def __init__(self, dataset, latency=0.0, failure_rate=0.0):
+        super().__init__(latency, failure_rate)
+        self.dataset = dataset
+
+    def route(self, method, path, query, body):
+        arg = lambda name: query.get(name, [None])[0]
+        data = self.dataset
+
+        if path == "/activitylist-service/activities/search/activities":
+            start, limit = int(arg("start") or 0), int(arg("limit") or 20)
+            if arg("startDate"):
+                # get_activities_by_date pages through a date window until a page is empty
+                first, last = arg("startDate"), arg("endDate") or "9999-12-31"
+                window = [a for a in data.activities if first <= a["startTimeLocal"][:10] <= last]
+                return 200, "get_activities_by_date", window[start:start + limit]
+            return 200, "get_activities", data.activities[start:start + limit]
+        match = re.match(r"/download-service/files/activity/(\d+)$", path)
+        if match:
+            activity_id = int(match.group(1))
+            return 200, "download_activity", fit_download(activity_id, random.Random(activity_id).randint(600, 3600))
+        match = re.match(r"/activity-service/activity/(\d+)/(splits|hrTimeInZones)$", path)
+        if match:
+            activity_id, detail = int(match.group(1)), match.group(2)
+            rng = random.Random(activity_id)
+            if detail == "splits":
+                laps = [{"lapIndex": i + 1, "distance": 1000.0, "duration": rng.uniform(240, 420),
+                         "averageSpeed": rng.uniform(2.4, 4.2)} for i in range(rng.randint(1, 12))]
+                return 200, "get_activity_splits", {"activityId": activity_id, "lapDTOs": laps}
+            return 200, "get_activity_hr_in_timezones", [
+                {"zoneNumber": zone, "secsInZone": rng.uniform(0, 900), "zoneLowBoundary": 90 + 15 * zone}
+                for zone in range(1, 6)
+            ]
+        if path == "/gear-service/gear/filterGear":
+            shoe = random.Random(int(arg("activityId") or 0)).choice(["Pegasus 40", "Vaporfly 3"])
+            return 200, "get_activity_gear", [{"gearTypeName": "Shoes", "customMakeModel": shoe, "displayName": shoe}]
+        if path.startswith("/personalrecord-service/personalrecord/prs/"):
+            return 200, "get_personal_record", data.records
+        match = re.match(r"/usersummary-service/stats/steps/daily/([\d-]+)/([\d-]+)$", path)
+        if match:
+            first, last = match.groups()
+            return 200, "get_daily_steps", [steps for day, steps in sorted(data.steps.items()) if first <= day <= last]
+        if path.startswith("/wellness-service/wellness/dailySleepData/"):
+            return 200, "get_sleep_data", data.sleep.get(arg("date"), {})
+        if path.startswith("/wellness-service/wellness/dailyStress/"):
+            return 200, "get_stress_data", {"calendarDate": path.rsplit("/", 1)[1], "avgStressLevel": 31, "maxStressLevel": 92}
+        if path.startswith("/usersummary-service/usersummary/hydration/daily/"):
+            return 200, "get_hydration_data", {"calendarDate": path.rsplit("/", 1)[1], "valueInML": 1800.0}
+        if path.startswith("/usersummary-service/usersummary/daily/"):
+            return 200, "get_user_summary", {
+                "calendarDate": arg("calendarDate"), "totalKilocalories": 2500.0, "consumedKilocalories": 2200.0,
+                "activeKilocalories": 600.0, "moderateIntensityMinutes": 20, "vigorousIntensityMinutes": 15,
+                "restingHeartRate": 52, "lastSevenDaysAvgRestingHeartRate": 53,
+                "totalSteps": data.steps.get(arg("calendarDate"), {}).get("totalSteps"), "privacyProtected": False,
+            }
+        if path.startswith("/wellness-service/wellness/dailyHeartRate/"):
+            return 200, "get_heart_rates", {"calendarDate": arg("date"), "restingHeartRate": 52, "lastSevenDaysAvgRestingHeartRate": 53}
+        if path == "/weight-service/weight/dateRange":
+            first, last = arg("startDate"), arg("endDate")
+            weights = [{"calendarDate": day, "date": 0, "weight": 72400.0} for day in sorted(data.steps) if first <= day <= last]
+            return 200, "get_body_composition", {"startDate": first, "endDate": last, "dateWeightList": weights, "totalAverage": {"weight": 72400.0}}
+        return 200, f"unhandled {path}", {}
+
+
+def plain_text(parts):
+    return "".join(part.get("plain_text") or part.get("text", {}).get("content", "") for part in parts or [])
+
+
+def notion_property(value):
+    # Turn a request property value into the shape Notion returns
+    for kind in ("title", "rich_text"):
+        if kind in value:
+            return {"type": kind, kind: [{"type": "text", "text": part["text"], "plain_text": part["text"]["content"]}
+                                         for part in value[kind]]}
+    kind = next(iter(value))
+    return {"type": kind, kind: value[kind]}
+
+
+def matches(page, condition):
+    if "and" in condition:
+        return all(matches(page, part) for part in condition["and"])
+    if "or" in condition:
+        return any(matches(page, part) for part in condition["or"])
+    prop = page["properties"].get(condition["property"], {})
+    for kind in ("date", "title", "rich_text", "select", "checkbox", "number"):
+        if kind in condition:
+            test = condition[kind]
+            break
+    else:
+        return True
+    if kind == "date":
+        value = ((prop.get("date") or {}).get("start") or "")[:10]
+        if not value:
+            return False
+        checks = {"equals": lambda v: value == v[:10], "on_or_after": lambda v: value >= v[:10],
+                  "on_or_before": lambda v: value <= v[:10], "after": lambda v: value > v[:10],
+                  "before": lambda v: value < v[:10]}
+    elif kind in ("title", "rich_text"):
+        value = plain_text(prop.get(kind))
+        checks = {"equals": lambda v: value == v, "contains": lambda v: v in value}
+    elif kind == "select":
+        value = (prop.get("select") or {}).get("name")
+        checks = {"equals": lambda v: value == v}
+    else:
+        value = prop.get(kind)
+        checks = {"equals": lambda v: value == v}
+    return all(checks[op](arg) for op, arg in test.items() if op in checks)
+
+
+class FakeNotionServer(CountingServer):
+    """In-memory Notion databases with schema, query, create and update."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        super().__init__(latency, failure_rate)
+        self.pages = {}
+        # database id -> {property name: type}, see add_database()
+        self.schemas = {}
+
+    def add_database(self, database_id, schema):
+        self.schemas[database_id] = dict(schema)
+
+    def route(self, method, path, query, body):
+        match = re.match(r"/v1/databases/([^/]+)$", path)
+        if match and method == "GET":
+            schema = self.schemas.get(match.group(1))
+            if schema is None:
+                return 404, "databases.retrieve", {"object": "error", "status": 404, "code": "object_not_found", "message": "Not found"}
+            return 200, "databases.retrieve", {
+                "object": "database", "id": match.group(1),
+                "properties": {name: {"id": name, "name": name, "type": kind, kind: {}} for name, kind in schema.items()},
+            }
+        match = re.match(r"/v1/databases/([^/]+)/query$", path)
+        if match and method == "POST":
+            body = body or {}
+            with self.lock:
+                pages = list(self.pages.values())
+            results = [page for page in pages
+                       if page["parent"]["database_id"] == match.group(1)
+                       and (not body.get("filter") or matches(page, body["filter"]))]
+            start = int(body.get("start_cursor") or 0)
+            size = int(body.get("page_size") or 100)
+            chunk = results[start:start + size]
+            more = start + size < len(results)
+            return 200, "databases.query", {"object": "list", "results": chunk, "has_more": more,
+                                            "next_cursor": str(start + size) if more else None}
+        if path == "/v1/pages" and method == "POST":
+            page = {"object": "page", "id": str(uuid.uuid4()), "parent": body["parent"],
+                    "created_time": datetime.utcnow().isoformat() + "Z",
+                    "properties": {name: notion_property(value) for name, value in body["properties"].items()}}
+            with self.lock:
+                self.pages[page["id"]] = page
+            return 200, "pages.create", page
+        match = re.match(r"/v1/pages/([^/]+)$", path)
+        if match and method == "PATCH":
+            page = self.pages.get(match.group(1))
+            if page is None:
+                return 404, "pages.update", {"object": "error", "status": 404, "code": "object_not_found", "message": "Not found"}
+            with self.lock:
+                page["properties"].update({name: notion_property(value) for name, value in body.get("properties", {}).items()})
+            return 200, "pages.update", page
+        return 404, f"unhandled {method} {path}", {"object": "error", "status": 404, "code": "object_not_found", "message": path}
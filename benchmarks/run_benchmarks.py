@@ -0,0 +1,169 @@
+"""
+Offline benchmarks for the sync scripts.
+
+Starts the local Garmin and Notion stand-ins from fake_servers.py, points the
+real garminconnect and notion_client libraries at them and runs each script's
+main() against datasets of increasing size. Every script runs twice per size:
+a cold run against an empty Notion database and empty sync state, and a warm
+rerun with nothing new to sync. For each run it reports wall time, Garmin and
+Notion requests, API calls per synced record and peak traced memory.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 10 100 1000 --latency-ms 20
+    python benchmarks/run_benchmarks.py --scripts activities --json results.json
+"""
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_servers import FakeGarminServer, FakeNotionServer, GarminDataset  # noqa: E402
+
+# name -> (script, database id variable, records synced for a dataset, env for a dataset)
+SCRIPTS = {
+    "activities": ("garmin-activities.py", "NOTION_DB_ID",
+                   lambda data: len(data.activities),
+                   lambda data: {"GARMIN_ACTIVITIES_LIMIT": str(len(data.activities))}),
+    "records": ("personal-records.py", "NOTION_PR_DB_ID",
+                lambda data: len(data.records),
+                lambda data: {}),
+    "steps": ("daily-steps.py", "NOTION_STEPS_DB_ID",
+              lambda data: len(data.days),
+              lambda data: {"GARMIN_STEPS_START": min(data.days).isoformat(),
+                            "GARMIN_STEPS_END": data.end.isoformat()}),
+    "sleep": ("sleep-data.py", "NOTION_SLEEP_DB_ID",
+              lambda data: len(data.days),
+              lambda data: {"GARMIN_SLEEP_START": min(data.days).isoformat(),
+                            "GARMIN_SLEEP_END": data.end.isoformat()}),
+}
+
+
+class LocalAdapter(HTTPAdapter):
+    """Send every garth request to the local Garmin stand-in."""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = self.base_url + parts.path + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+def local_garmin(base_url):
+    # A logged-in Garmin client whose requests go to the stand-in server
+    from garminconnect import Garmin
+    from garth.auth_tokens import OAuth1Token, OAuth2Token
+
+    far = int(time.time()) + 365 * 86400
+    garmin = Garmin("bench@example.com", "bench")
+    garmin.display_name = "bench"
+    garmin.garth.oauth1_token = OAuth1Token(oauth_token="bench", oauth_token_secret="bench")
+    garmin.garth.oauth2_token = OAuth2Token(
+        scope="", jti="", token_type="Bearer", access_token="bench", refresh_token="bench",
+        expires_in=far, expires_at=far, refresh_token_expires_in=far, refresh_token_expires_at=far,
+    )
+    garmin.garth.sess.mount("https://", LocalAdapter(base_url))
+    return garmin
+
+
+def run_script(name, dataset, garmin_server, notion_server, state_dir, notion_rate=None, verbose=False):
+    from notion_client import Client
+    from notion_writer import NotionWriter
+    from resilience import RetryingGarmin
+    from sync_runner import load_script
+
+    filename, db_var, record_count, script_env = SCRIPTS[name]
+    module = load_script(filename)
+
+    # Point the script's clients at the stand-ins
+    # Retrying like get_garmin(), but without the response cache so every fetch is measured
+    garmin = RetryingGarmin(local_garmin(garmin_server.url))
+    module.get_garmin = lambda *args, **kwargs: garmin
+    if hasattr(module, "Client"):
+        module.Client = functools.partial(Client, base_url=notion_server.url)
+    writer_options = {"rate": notion_rate, "burst": notion_rate} if notion_rate else {}
+    module.NotionWriter = functools.partial(NotionWriter, base_url=notion_server.url, **writer_options)
+
+    # The superset of properties, so optional enrichment fields pass the schema check too
+    notion_server.add_database(f"bench-{name}", getattr(module, "FIELD_TYPES", module.NOTION_SCHEMA))
+    os.environ.update(script_env(dataset))
+    os.environ.update({"SYNC_STATE_DIR": state_dir, db_var: f"bench-{name}", "NOTION_TOKEN": "bench"})
+
+    garmin_server.reset_counts()
+    notion_server.reset_counts()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+        module.main()
+    wall = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    records = max(record_count(dataset), 1)
+    garmin_calls = sum(garmin_server.calls.values())
+    notion_calls = sum(notion_server.calls.values())
+    return {
+        "wall_s": round(wall, 3),
+        "records": records,
+        "garmin_calls": garmin_calls,
+        "notion_calls": notion_calls,
+        "calls_per_record": round((garmin_calls + notion_calls) / records, 3),
+        "peak_mem_mb": round(peak / 1e6, 2),
+        "garmin_endpoints": dict(garmin_server.calls),
+        "notion_endpoints": dict(notion_server.calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="activities per dataset")
+    parser.add_argument("--days", type=int, default=30, help="days of steps and sleep history per dataset")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="latency added to every fake request")
+    parser.add_argument("--scripts", nargs="+", choices=sorted(SCRIPTS), default=list(SCRIPTS))
+    parser.add_argument("--notion-rate", type=float, help="writer requests per second (default: Notion's limit)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of fake requests answered with a 503")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the scripts' own output")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'script':<11} {'size':>6} {'run':<5} {'wall s':>8} {'garmin':>7} {'notion':>7} {'calls/rec':>10} {'peak MB':>8}")
+    for size in args.sizes:
+        dataset = GarminDataset(activities=size, days=args.days)
+        for name in args.scripts:
+            garmin_server = FakeGarminServer(dataset, args.latency_ms / 1000, args.failure_rate).start()
+            notion_server = FakeNotionServer(args.latency_ms / 1000, args.failure_rate).start()
+            try:
+                with tempfile.TemporaryDirectory() as state_dir:
+                    for run in ("cold", "warm"):
+                        result = run_script(name, dataset, garmin_server, notion_server, state_dir, args.notion_rate, args.verbose)
+                        result.update(script=name, size=size, run=run)
+                        results.append(result)
+                        print(f"{name:<11} {size:>6} {run:<5} {result['wall_s']:>8.2f} {result['garmin_calls']:>7} "
+                              f"{result['notion_calls']:>7} {result['calls_per_record']:>10.2f} {result['peak_mem_mb']:>8.2f}")
+            finally:
+                garmin_server.stop()
+                notion_server.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Best efforts computed from per-second activity streams.
+
+Garmin's personal records cover a fixed list (1K, 1mi, 5K, 10K, 20 min
+power). This module computes the fastest time over any distance for runs
+and the best average power over any duration for rides, from the CSV time
+series that fit_archive.py writes next to each FIT file. Bests are kept for
+all time, per year and per gear (shoes for runs), in
+`SYNC_STATE_DIR/best-efforts.sqlite3`.
+
+Each activity is processed once per effort set: its stream is turned into
+cumulative distance and energy with NumPy, every start sample is matched to
+the point where the target distance or duration is reached with np.interp,
+and the best of all windows is compared with the stored bests. Activities
+that have no CSV yet, or whose gear could not be fetched, are picked up on
+a later run; changing the effort lists processes the archive once more for
+the new set, and only the configured efforts are reported. personal-records.py
+writes the results through its usual record path. NumPy is optional;
+without it best efforts are skipped.
+
+BEST_EFFORT_DISTANCES (metres) and BEST_EFFORT_DURATIONS (seconds) take
+comma-separated lists to replace the defaults below.
+"""
+import os
+import sqlite3
+import threading
+import warnings
+from datetime import datetime, timezone
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from sync_state import state_path
+
+# Fastest time over these distances (metres) for runs
+EFFORT_DISTANCES = [400, 1000, 1609.344, 5000, 10000, 21097.5, 42195]
+# Best average power over these durations (seconds) for rides
+EFFORT_DURATIONS = [5, 60, 300, 1200, 3600]
+
+DISTANCE_TYPES = {"Running"}
+POWER_TYPES = {"Cycling"}
+
+DISTANCE_NAMES = {1609.344: "1mi", 21097.5: "Half Marathon", 42195: "Marathon"}
+
+# The CSV columns best efforts read (see fit_archive.CSV_COLUMNS)
+STREAM_COLUMNS = ["timestamp", "speed_mps", "distance_m", "power_w"]
+
+
+def configured(variable, default):
+    value = os.getenv(variable)
+    return [float(part) for part in value.split(",") if part.strip()] if value else default
+
+
+def distance_name(metres):
+    if metres in DISTANCE_NAMES:
+        return DISTANCE_NAMES[metres]
+    return f"{metres / 1000:g}K" if metres >= 1000 else f"{metres:g}m"
+
+
+def duration_name(seconds):
+    if seconds < 60:
+        return f"{seconds:g} s"
+    if seconds < 3600:
+        return f"{seconds / 60:g} min"
+    return f"{seconds / 3600:g} h"
+
+
+def load_stream(csv_path):
+    # (elapsed seconds, cumulative distance in m, power in W) of an archived activity
+    with open(csv_path, encoding="utf-8") as f:
+        header = f.readline().rstrip("\r\n").split(",")
+    # NumPy's C reader loads the columns as text, converted below as whole arrays
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # a file without samples
+        columns = np.loadtxt(csv_path, delimiter=",", skiprows=1, dtype=str, ndmin=2, encoding="utf-8",
+                             usecols=[header.index(name) for name in STREAM_COLUMNS])
+    # Seconds resolution: the first 19 characters, without fractions or the UTC offset
+    stamps = columns[:, 0].astype("U19").astype("datetime64[s]")
+    dated = ~np.isnat(stamps)
+    if dated.sum() < 2:
+        return None
+    t = stamps[dated].astype(np.float64)
+    t -= t[0]
+    values = columns[dated, 1:]
+    speed, distance, power = np.where(values == "", "nan", values).astype(np.float64).T
+
+    if np.isnan(distance).all():
+        # No distance field in the file: integrate speed over time
+        distance = np.concatenate(([0.0], np.cumsum(np.nan_to_num(speed[1:]) * np.diff(t))))
+    else:
+        distance = np.maximum.accumulate(np.nan_to_num(distance))
+    return t, distance, np.nan_to_num(power)
+
+
+def fastest_times(t, distance, targets):
+    # Shortest time to cover each target distance, starting at any sample; nan if never covered
+    results = []
+    for target in targets:
+        starts = distance + target <= distance[-1]
+        if not starts.any():
+            results.append(float("nan"))
+            continue
+        finish = np.interp(distance[starts] + target, distance, t)
+        results.append(float((finish - t[starts]).min()))
+    return results
+
+
+def best_powers(t, power, durations):
+    # Highest average power over each duration, starting at any sample; nan if the ride is shorter
+    energy = np.concatenate(([0.0], np.cumsum(power[:-1] * np.diff(t))))
+    results = []
+    for duration in durations:
+        starts = t + duration <= t[-1]
+        if not starts.any() or not power.any():
+            results.append(float("nan"))
+            continue
+        end_energy = np.interp(t[starts] + duration, t, energy)
+        results.append(float(((end_energy - energy[starts]) / duration).max()))
+    return results
+
+
+def effort_targets():
+    # (distances, durations) currently configured
+    return (configured("BEST_EFFORT_DISTANCES", EFFORT_DISTANCES),
+            configured("BEST_EFFORT_DURATIONS", EFFORT_DURATIONS))
+
+
+def effort_set(targets):
+    # What an activity was processed for, so a changed list reprocesses it
+    return ",".join(f"{target:g}" for target in sorted(targets))
+
+
+def gear_name(garmin, activity_id):
+    for item in garmin.get_activity_gear(activity_id) or []:
+        name = item.get('customMakeModel') or item.get('displayName')
+        if name:
+            return name
+    return None
+
+
+def format_time(seconds):
+    seconds = round(seconds)
+    hours, minutes = divmod(seconds // 60, 60)
+    return f"{hours}:{minutes:02d}:{seconds % 60:02d}" if hours else f"{minutes}:{seconds % 60:02d}"
+
+
+def record_name(effort, scope):
+    if scope == "all":
+        return f"Best {effort}"
+    kind, _, label = scope.partition(":")
+    return f"Best {effort} {label}" if kind == "year" else f"Best {effort} · {label}"
+
+
+def record_value(kind, metres_or_seconds, value):
+    # (Value, Pace) as the personal records database shows them
+    if kind == "distance":
+        return format_time(value), f"{format_time(value / (metres_or_seconds / 1000))} /km"
+    return f"{round(value)} W", ""
+
+
+class BestEfforts:
+    """Best effort per (effort, scope), updated one new activity at a time."""
+
+    def __init__(self, path=None):
+        path = path or os.getenv("BEST_EFFORTS_PATH") or state_path("best-efforts.sqlite3")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS efforts (
+                    effort TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    target REAL NOT NULL,
+                    value REAL NOT NULL,
+                    activity_id INTEGER NOT NULL,
+                    activity_type TEXT,
+                    date TEXT NOT NULL,
+                    PRIMARY KEY (effort, scope)
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed (activity_id INTEGER PRIMARY KEY, processed_at TEXT NOT NULL, efforts TEXT)"
+            )
+            # Older stores did not record the effort set; their activities are processed again once
+            if "efforts" not in {row[1] for row in self.conn.execute("PRAGMA table_info(processed)")}:
+                self.conn.execute("ALTER TABLE processed ADD COLUMN efforts TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def offer(self, effort, scope, kind, target, value, activity_id, activity_type, date):
+        # Keep the effort if it beats the stored one: less time, or more power
+        better = "value > excluded.value" if kind == "distance" else "value < excluded.value"
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"""
+                INSERT INTO efforts (effort, scope, kind, target, value, activity_id, activity_type, date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (effort, scope) DO UPDATE SET
+                    value = excluded.value, activity_id = excluded.activity_id,
+                    activity_type = excluded.activity_type, date = excluded.date
+                WHERE {better}
+                """,
+                (effort, scope, kind, target, value, activity_id, activity_type, date),
+            )
+
+    def update(self, garmin, store, fit_dir):
+        # Process the activities not seen yet that have an archived stream; returns how many
+        types = sorted(DISTANCE_TYPES | POWER_TYPES)
+        candidates = store.query(
+            f"SELECT activity_id, activity_type, date FROM activities "
+            f"WHERE activity_type IN ({', '.join('?' for _ in types)}) ORDER BY date",
+            types,
+        )
+        with self.lock:
+            processed = dict(self.conn.execute("SELECT activity_id, efforts FROM processed"))
+        distances, durations = effort_targets()
+
+        count = 0
+        for activity_id, activity_type, date in candidates:
+            csv_path = os.path.join(fit_dir, f"{activity_id}.csv")
+            targets = distances if activity_type in DISTANCE_TYPES else durations
+            if processed.get(activity_id) == effort_set(targets) or not os.path.exists(csv_path):
+                continue
+            stream = load_stream(csv_path)
+            if stream is not None:
+                try:
+                    gear = gear_name(garmin, activity_id)
+                except Exception as e:
+                    # Left unprocessed, so its per-gear bests are not lost for good
+                    print(f"⚠️ Could not fetch gear of activity {activity_id}, retrying next run: {e}")
+                    continue
+                t, distance, power = stream
+                if activity_type in DISTANCE_TYPES:
+                    efforts = [("distance", distance_name(m), m, value)
+                               for m, value in zip(distances, fastest_times(t, distance, distances))]
+                else:
+                    efforts = [("power", duration_name(s), s, value)
+                               for s, value in zip(durations, best_powers(t, power, durations))]
+                scopes = ["all", f"year:{date[:4]}"]
+                if gear:
+                    scopes.append(f"gear:{gear}")
+                for kind, effort, target, value in efforts:
+                    if value == value:  # not nan
+                        for scope in scopes:
+                            self.offer(effort, scope, kind, target, value, activity_id, activity_type, date)
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO processed (activity_id, processed_at, efforts) VALUES (?, ?, ?)",
+                    (activity_id, datetime.now(timezone.utc).isoformat(), effort_set(targets)),
+                )
+            count += 1
+        return count
+
+    def records(self):
+        # The current bests of the configured efforts as personal record fields
+        distances, durations = effort_targets()
+        configured_targets = {("distance", m) for m in distances} | {("power", s) for s in durations}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT effort, scope, kind, target, value, activity_type, date FROM efforts ORDER BY kind, target, scope"
+            ).fetchall()
+        records = []
+        for effort, scope, kind, target, value, activity_type, date in rows:
+            if (kind, target) not in configured_targets:
+                continue
+            formatted, pace = record_value(kind, target, value)
+            records.append({
+                "name": record_name(effort, scope),
+                "activity_type": activity_type,
+                "date": date,
+                "value": formatted,
+                "pace": pace,
+            })
+        return records
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def best_effort_records(garmin, store):
+    # Update the bests from newly archived activities and return them, [] if unavailable
+    fit_dir = os.getenv("GARMIN_FIT_DIR", "fit-archive")
+    if store is None or not os.path.isdir(fit_dir):
+        return []
+    if np is None:
+        print("ℹ️ Skipping best efforts: numpy is not installed")
+        return []
+    with BestEfforts() as efforts:
+        processed = efforts.update(garmin, store, fit_dir)
+        if processed:
+            print(f"🏁 Best efforts: {processed} new activit{'y' if processed == 1 else 'ies'} processed")
+        return efforts.records()
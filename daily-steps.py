@@ -1,93 +1,201 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
-from garminconnect import Garmin
+from analytics_store import AnalyticsStore
+from garmin_session import get_garmin
 from notion_client import Client
+from notion_client.helpers import iterate_paginated_api
 from dotenv import load_dotenv
+from notion_schema import check_schema
+from notion_writer import NotionWriter
+from resilience import resilient_notion
+from sync_plan import SyncPlan, dry_run
+from sync_state import SyncLedger, payload_hash
 import os
 
-def get_all_daily_steps(garmin):
+# Garmin serves at most 28 days of daily steps per request
+STEPS_CHUNK_DAYS = 28
+STEPS_FETCH_WORKERS = 4
+
+# Properties written by this sync and their Notion types
+NOTION_SCHEMA = {
+    "Activity Type": "title",
+    "Date": "date",
+    "Total Steps": "number",
+    "Step Goal": "number",
+    "Total Distance (km)": "number",
+}
+
+def steps_date_range():
+    """
+    Dates to sync: GARMIN_STEPS_START to GARMIN_STEPS_END (ISO dates, inclusive),
+    yesterday by default.
     """
-    Get last x days of daily step count data from Garmin Connect.
+    yesterday = date.today() - timedelta(days=1)
+    start = os.getenv("GARMIN_STEPS_START")
+    end = os.getenv("GARMIN_STEPS_END")
+    start = date.fromisoformat(start) if start else yesterday
+    end = date.fromisoformat(end) if end else max(start, yesterday)
+    return start, end
+
+def date_chunks(start, end, days=STEPS_CHUNK_DAYS):
+    """
+    Split an inclusive date range into consecutive ranges of at most `days` days.
     """
-    startdate = date.today() - timedelta(days=1)
-    daterange = [startdate + timedelta(days=x) 
-                 for x in range((date.today() - startdate).days)] # excl. today
-    daily_steps = []
-    for d in daterange:
-        daily_steps += garmin.get_daily_steps(d.isoformat(), d.isoformat())
-    return daily_steps
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=days - 1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+    return chunks
 
-def daily_steps_exist(client, database_id, activity_date):
+def get_all_daily_steps(garmin, start, end, max_workers=STEPS_FETCH_WORKERS):
     """
-    Check if daily step count already exists in the Notion database.
+    Get daily step count data from Garmin Connect, one range call per chunk.
+    Chunks are fetched in parallel; returns (chunk, daily steps) pairs in date order.
     """
-    query = client.databases.query(
+    chunks = date_chunks(start, end)
+    def fetch(chunk):
+        return garmin.get_daily_steps(chunk[0].isoformat(), chunk[1].isoformat())
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        return list(zip(chunks, pool.map(fetch, chunks)))
+
+def daily_steps_in_range(client, database_id, start, end):
+    """
+    Get the existing daily steps entries between two dates with one (paginated) query.
+    """
+    pages = iterate_paginated_api(
+        client.databases.query,
         database_id=database_id,
         filter={
             "and": [
-                {"property": "Date", "date": {"equals": activity_date}},
+                {"property": "Date", "date": {"on_or_after": start.isoformat()}},
+                {"property": "Date", "date": {"on_or_before": end.isoformat()}},
                 {"property": "Activity Type", "title": {"equals": "Walking"}}
             ]
         }
     )
-    results = query['results']
-    return results[0] if results else None
+    existing = {}
+    for page in pages:
+        start_date = (page['properties']['Date'].get('date') or {}).get('start')
+        if start_date:
+            existing.setdefault(start_date[:10], page)
+    return existing
 
 def steps_need_update(existing_steps, new_steps):
     """
     Compare existing steps data with imported data to determine if an update is needed.
     """
     existing_props = existing_steps['properties']
+    new_props = daily_steps_properties(new_steps)
     activity_type = "Walking"
     
     return (
-        existing_props['Total Steps']['number'] != new_steps.get('totalSteps') or
-        existing_props['Step Goal']['number'] != new_steps.get('stepGoal') or
-        existing_props['Total Distance (km)']['number'] != new_steps.get('totalDistance') or
-        existing_props['Activity Type']['title'] != activity_type
+        existing_props['Total Steps']['number'] != new_props['Total Steps']['number'] or
+        existing_props['Step Goal']['number'] != new_props['Step Goal']['number'] or
+        existing_props['Total Distance (km)']['number'] != new_props['Total Distance (km)']['number'] or
+        "".join(t.get('plain_text', "") for t in existing_props['Activity Type']['title']) != activity_type
     )
 
-def update_daily_steps(client, existing_steps, new_steps):
+def daily_steps_properties(steps):
     """
-    Update an existing daily steps entry in the Notion database with new data.
+    Build the Notion properties for a daily steps entry.
     """
-    total_distance = new_steps.get('totalDistance')
+    total_distance = steps.get('totalDistance')
     if total_distance is None:
         total_distance = 0
-    properties = {
-        "Activity Type":  {"title": [{"text": {"content": "Walking"}}]},
-        "Total Steps": {"number": new_steps.get('totalSteps')},
-        "Step Goal": {"number": new_steps.get('stepGoal')},
+    return {
+        "Activity Type": {"title": [{"text": {"content": "Walking"}}]},
+        "Date": {"date": {"start": steps.get('calendarDate')}},
+        "Total Steps": {"number": steps.get('totalSteps')},
+        "Step Goal": {"number": steps.get('stepGoal')},
         "Total Distance (km)": {"number": round(total_distance / 1000, 2)}
     }
+
+def daily_steps_row(steps):
+    """
+    Build the analytics store row for a daily steps entry.
+    """
+    return {
+        "date": steps.get('calendarDate'),
+        "steps": steps.get('totalSteps'),
+        "step_goal": steps.get('stepGoal'),
+        "distance_km": round((steps.get('totalDistance') or 0) / 1000, 2),
+    }
+
+def update_daily_steps(writer, existing_steps, new_steps, on_success=None):
+    """
+    Update an existing daily steps entry in the Notion database with new data.
+    """
+    properties = daily_steps_properties(new_steps)
+    del properties["Date"]
     
     update = {
         "page_id": existing_steps['id'],
         "properties": properties,
     }
         
-    client.pages.update(**update)
+    writer.update(on_success=on_success, **update)
 
-def create_daily_steps(client, database_id, steps):
+def create_daily_steps(writer, database_id, steps, on_success=None):
     """
     Create a new daily steps entry in the Notion database.
     """
-    total_distance = steps.get('totalDistance')
-    if total_distance is None:
-        total_distance = 0
-    properties = {
-        "Activity Type": {"title": [{"text": {"content": "Walking"}}]},
-        "Date": {"date": {"start": steps.get('calendarDate')}},
-        "Total Steps": {"number": steps.get('totalSteps')},
-        "Step Goal": {"number": steps.get('stepGoal')},
-        "Total Distance (km)": {"number": round(total_distance / 1000, 2)}
-    }
-    
     page = {
         "parent": {"database_id": database_id},
-        "properties": properties,
+        "properties": daily_steps_properties(steps),
     }
     
-    client.pages.create(**page)
+    writer.create(on_success=on_success, **page)
+
+def run_sync(garmin, client, writer, ledger, database_id, store=None):
+    """
+    Sync daily steps from Garmin Connect to the Notion database.
+    """
+    check_schema(client, database_id, NOTION_SCHEMA, "Daily steps database")
+
+    # Each chunk is planned against one ranged query, then applied while the next is planned
+    plan = SyncPlan("Daily steps")
+    dry = dry_run()
+    start, end = steps_date_range()
+    for (chunk_start, chunk_end), daily_steps in get_all_daily_steps(garmin, start, end):
+        if store:
+            store.add("daily_steps", [daily_steps_row(steps) for steps in daily_steps if steps.get('calendarDate')])
+        existing_pages = None
+        for steps in daily_steps:
+            steps_date = steps.get('calendarDate')
+            digest = payload_hash(daily_steps_properties(steps))
+
+            def record_page(page, steps_date=steps_date, digest=digest):
+                ledger.record("steps", steps_date, page['id'], digest)
+
+            # Days in the ledger need no lookup: skip them if unchanged, update them otherwise
+            synced = ledger.get("steps", steps_date)
+            if synced:
+                page_id, synced_digest = synced
+                if synced_digest != digest:
+                    update_daily_steps(plan, {'id': page_id}, steps, on_success=record_page)
+                else:
+                    plan.noop(steps_date)
+                continue
+
+            # Look up the rest of the chunk in Notion with a single ranged query
+            if existing_pages is None:
+                existing_pages = daily_steps_in_range(client, database_id, chunk_start, chunk_end)
+            existing_steps = existing_pages.get(steps_date)
+            if existing_steps:
+                if steps_need_update(existing_steps, steps):
+                    update_daily_steps(plan, existing_steps, steps, on_success=record_page)
+                else:
+                    plan.noop(steps_date, on_success=record_page, page=existing_steps)
+            else:
+                create_daily_steps(plan, database_id, steps, on_success=record_page)
+
+        if not dry:
+            plan.apply(writer)
+
+    if dry:
+        plan.report()
+    return plan.writes()
 
 def main():
     load_dotenv()
@@ -98,20 +206,12 @@ def main():
     notion_token = os.getenv("NOTION_TOKEN")
     database_id = os.getenv("NOTION_STEPS_DB_ID")
 
-    # Initialize Garmin client and login
-    garmin = Garmin(garmin_email, garmin_password)
-    garmin.login()
-    client = Client(auth=notion_token)
-
-    daily_steps = get_all_daily_steps(garmin)
-    for steps in daily_steps:
-        steps_date = steps.get('calendarDate')
-        existing_steps = daily_steps_exist(client, database_id, steps_date)
-        if existing_steps:
-            if steps_need_update(existing_steps, steps):
-                update_daily_steps(client, existing_steps, steps)
-        else:
-            create_daily_steps(client, database_id, steps)
+    # Initialize Garmin client, reusing the saved session when possible
+    garmin = get_garmin(garmin_email, garmin_password)
+
+    with SyncLedger() as ledger, AnalyticsStore() as store, NotionWriter(auth=notion_token, journal=ledger) as writer:
+        client = resilient_notion(Client(auth=notion_token), limiter=writer)
+        run_sync(garmin, client, writer, ledger, database_id, store)
 
 if __name__ == '__main__':
     main()
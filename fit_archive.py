@@ -0,0 +1,257 @@
+"""
+Archive the original FIT file of every Garmin activity, with a CSV time series.
+
+Each activity's original upload is streamed to disk in chunks (to a `.part`
+file that is renamed once complete), unpacked from Garmin's zip into
+`GARMIN_FIT_DIR/<activityId>.fit` and parsed in a single streaming pass:
+the FIT `record` messages become `<activityId>.csv` with one row per sample
+(timestamp, heart rate, speed, power, altitude, cadence, distance). Files
+already on disk are skipped, so an interrupted archive resumes where it
+stopped. Activities are listed page by page and neither the download nor the
+parser holds more than one message in memory, so file size and archive size
+do not matter.
+
+Usage: python fit_archive.py
+    GARMIN_FIT_DIR       where to write the files (default fit-archive)
+    GARMIN_FIT_LIMIT     only archive the latest N activities (default all)
+    GARMIN_FIT_WORKERS   downloads in flight at once (default 2)
+"""
+import csv
+import os
+import shutil
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from garmin_session import get_garmin
+from resilience import retry_call
+from sync_runner import load_script
+
+FIT_DOWNLOAD_PATH = "/download-service/files/activity"
+CHUNK_BYTES = 64 * 1024
+FIT_WORKERS = 2
+
+# Seconds between the Unix epoch and the FIT epoch (1989-12-31T00:00:00Z)
+FIT_EPOCH = 631065600
+RECORD_MESSAGE = 20
+TIMESTAMP_FIELD = 253
+
+# FIT base type -> (struct format, invalid value)
+BASE_TYPES = {
+    0x00: ("B", 0xFF), 0x01: ("b", 0x7F), 0x02: ("B", 0xFF), 0x0A: ("B", 0x00),
+    0x83: ("h", 0x7FFF), 0x84: ("H", 0xFFFF), 0x8B: ("H", 0x0000),
+    0x85: ("i", 0x7FFFFFFF), 0x86: ("I", 0xFFFFFFFF), 0x8C: ("I", 0x00000000),
+}
+
+# record message field number -> (CSV column, scale, offset)
+RECORD_FIELDS = {
+    3: ("heart_rate", 1, 0),
+    6: ("speed_mps", 1000, 0),
+    73: ("speed_mps", 1000, 0),
+    7: ("power_w", 1, 0),
+    2: ("altitude_m", 5, 500),
+    78: ("altitude_m", 5, 500),
+    4: ("cadence", 1, 0),
+    5: ("distance_m", 100, 0),
+}
+CSV_COLUMNS = ["timestamp", "heart_rate", "speed_mps", "power_w", "altitude_m", "cadence", "distance_m"]
+
+
+class FitError(Exception):
+    """The file is not a readable FIT file."""
+
+
+def read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise FitError("unexpected end of file")
+    return data
+
+
+def decode_field(data, base_type, little_endian):
+    # A single value of a base type we know, None for invalid values and anything else
+    fmt, invalid = BASE_TYPES.get(base_type & 0x9F, (None, None))
+    if fmt is None or struct.calcsize(fmt) != len(data):
+        return None
+    value = struct.unpack(("<" if little_endian else ">") + fmt, data)[0]
+    return None if value == invalid else value
+
+
+def iter_records(f):
+    """
+    Yield the `record` messages of a FIT stream as {field number: raw value},
+    with the timestamp under TIMESTAMP_FIELD. Only the current message and
+    the (at most 16) local message definitions are held in memory.
+    """
+    while True:
+        header = f.read(1)
+        if not header:
+            return
+        header_size = header[0]
+        rest = read_exactly(f, header_size - 1)
+        if rest[7:11] != b".FIT":
+            raise FitError("missing .FIT signature")
+        data_size = struct.unpack("<I", rest[3:7])[0]
+
+        definitions = {}
+        last_timestamp = None
+        remaining = data_size
+        while remaining > 0:
+            record_header = read_exactly(f, 1)[0]
+            remaining -= 1
+            if record_header & 0x80:
+                # Compressed timestamp header: a data message with a 5-bit time offset
+                local_type = (record_header >> 5) & 0x03
+                offset = record_header & 0x1F
+                timestamp = None
+                if last_timestamp is not None:
+                    timestamp = (last_timestamp & ~0x1F) + offset
+                    if offset < (last_timestamp & 0x1F):
+                        timestamp += 0x20
+                    last_timestamp = timestamp
+            elif record_header & 0x40:
+                local_type = record_header & 0x0F
+                _, architecture = read_exactly(f, 2)
+                little_endian = architecture == 0
+                global_number = struct.unpack("<H" if little_endian else ">H", read_exactly(f, 2))[0]
+                field_count = read_exactly(f, 1)[0]
+                fields = [tuple(read_exactly(f, 3)) for _ in range(field_count)]
+                remaining -= 5 + 3 * field_count
+                developer_size = 0
+                if record_header & 0x20:
+                    developer_count = read_exactly(f, 1)[0]
+                    developer_fields = [tuple(read_exactly(f, 3)) for _ in range(developer_count)]
+                    developer_size = sum(size for _, size, _ in developer_fields)
+                    remaining -= 1 + 3 * developer_count
+                # Where the fields we want sit in the message, so it can be read in one call
+                wanted, position = [], 0
+                for number, size, base_type in fields:
+                    if number == TIMESTAMP_FIELD or (global_number == RECORD_MESSAGE and number in RECORD_FIELDS):
+                        wanted.append((number, position, size, base_type))
+                    position += size
+                definitions[local_type] = (global_number, little_endian, wanted, position + developer_size)
+                continue
+            else:
+                local_type = record_header & 0x0F
+                timestamp = None
+
+            if local_type not in definitions:
+                raise FitError(f"data message for undefined local type {local_type}")
+            global_number, little_endian, wanted, message_size = definitions[local_type]
+            message = read_exactly(f, message_size)
+            remaining -= message_size
+            values = {
+                number: decode_field(message[position:position + size], base_type, little_endian)
+                for number, position, size, base_type in wanted
+            }
+
+            if values.get(TIMESTAMP_FIELD) is not None:
+                last_timestamp = values[TIMESTAMP_FIELD]
+            elif timestamp is not None:
+                values[TIMESTAMP_FIELD] = timestamp
+            if global_number == RECORD_MESSAGE:
+                yield values
+
+        # File CRC; chained FIT files simply continue with the next header
+        read_exactly(f, 2)
+
+
+def record_row(values):
+    row = {}
+    timestamp = values.get(TIMESTAMP_FIELD)
+    if timestamp is not None:
+        row["timestamp"] = datetime.fromtimestamp(timestamp + FIT_EPOCH, timezone.utc).isoformat()
+    for number, (column, scale, offset) in RECORD_FIELDS.items():
+        value = values.get(number)
+        # The enhanced speed/altitude fields take precedence over the 16-bit ones
+        if value is not None and (column not in row or number > 70):
+            row[column] = value if scale == 1 and offset == 0 else round(value / scale - offset, 3)
+    return row
+
+
+def fit_to_csv(fit_path, csv_path):
+    # One streaming pass over the FIT file; returns the number of samples written
+    tmp_path = csv_path + ".part"
+    samples = 0
+    with open(fit_path, "rb") as f, open(tmp_path, "w", newline="") as out:
+        writer = csv.DictWriter(out, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for values in iter_records(f):
+            writer.writerow(record_row(values))
+            samples += 1
+    os.replace(tmp_path, csv_path)
+    return samples
+
+
+def download_original(garmin, activity_id, fit_path):
+    # Stream the original upload to disk, then unpack the FIT file from Garmin's zip
+    download_path = fit_path + ".download.part"
+    response = garmin.garth.get("connectapi", f"{FIT_DOWNLOAD_PATH}/{activity_id}", api=True, stream=True)
+    try:
+        with open(download_path, "wb") as f:
+            for chunk in response.iter_content(CHUNK_BYTES):
+                f.write(chunk)
+    finally:
+        response.close()
+
+    if zipfile.is_zipfile(download_path):
+        with zipfile.ZipFile(download_path) as archive:
+            member = next((name for name in archive.namelist() if name.lower().endswith(".fit")), None)
+            if member is None:
+                os.remove(download_path)
+                raise FitError(f"no FIT file in the download of activity {activity_id}")
+            with archive.open(member) as src, open(fit_path + ".part", "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_BYTES)
+        os.remove(download_path)
+        os.replace(fit_path + ".part", fit_path)
+    else:
+        os.replace(download_path, fit_path)
+
+
+def archive_activity(garmin, archive_dir, activity_id):
+    # Returns (downloaded, parsed) for the summary
+    fit_path = os.path.join(archive_dir, f"{activity_id}.fit")
+    csv_path = os.path.join(archive_dir, f"{activity_id}.csv")
+    downloaded = parsed = False
+    if not os.path.exists(fit_path):
+        retry_call(download_original, garmin, activity_id, fit_path, name="garmin.download_activity")
+        downloaded = True
+    if not os.path.exists(csv_path):
+        fit_to_csv(fit_path, csv_path)
+        parsed = True
+    return downloaded, parsed
+
+
+def main():
+    load_dotenv()
+    archive_dir = os.getenv("GARMIN_FIT_DIR", "fit-archive")
+    limit = int(os.environ["GARMIN_FIT_LIMIT"]) if os.getenv("GARMIN_FIT_LIMIT") else None
+    workers = int(os.getenv("GARMIN_FIT_WORKERS", FIT_WORKERS))
+    os.makedirs(archive_dir, exist_ok=True)
+
+    garmin = get_garmin(os.getenv("GARMIN_EMAIL"), os.getenv("GARMIN_PASSWORD"))
+    activities = load_script("garmin-activities.py")
+
+    downloaded = parsed = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # One page of activities in flight at a time keeps the listing bounded too
+        for page in activities.iter_activity_pages(garmin, limit):
+            ids = [activity['activityId'] for activity in page if activity.get('activityId')]
+            futures = {activity_id: pool.submit(archive_activity, garmin, archive_dir, activity_id) for activity_id in ids}
+            for activity_id, future in futures.items():
+                try:
+                    new_file, new_csv = future.result()
+                    downloaded += new_file
+                    parsed += new_csv
+                except Exception as e:
+                    print(f"❌ Activity {activity_id}: {e}")
+                    failed += 1
+
+    print(f"✅ FIT archive in {archive_dir}: {downloaded} downloaded, {parsed} parsed, {failed} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,18 @@
-from datetime import datetime, timezone
-from garminconnect import Garmin
+from datetime import datetime, timedelta, timezone
+from activity_details import DETAIL_FIELD_TYPES, ActivityDetails, enrichment_enabled
+from activity_record import project_activities
+from analytics_store import AnalyticsStore
+from garmin_session import get_garmin
 from notion_client import Client
+from notion_client.helpers import iterate_paginated_api
 from dotenv import load_dotenv
+from notion_schema import check_schema
+from notion_writer import NotionWriter
+from resilience import resilient_notion
+from sync_plan import SyncPlan, dry_run
+from sync_state import SyncLedger, payload_hash, state_path
 import pytz
+import json
 import os
 
 # Your local time zone, replace with the appropriate one if needed
@@ -30,8 +40,51 @@ ACTIVITY_ICONS = {
     # Add more mappings as needed
 }
 
-def get_all_activities(garmin, limit=1000):
-    return garmin.get_activities(0, limit)
+def load_checkpoint(checkpoint_file):
+    try:
+        with open(checkpoint_file) as f:
+            return json.load(f).get('offset', 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def save_checkpoint(checkpoint_file, offset):
+    os.makedirs(os.path.dirname(checkpoint_file) or '.', exist_ok=True)
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump({'offset': offset}, f)
+    os.replace(tmp_file, checkpoint_file)
+
+def iter_activity_pages(garmin, limit=None, page_size=100, checkpoint_file=None, finished=None):
+
+    # Walk get_activities(start, page_size) page by page, newest first.
+    # With a checkpoint file, the offset of the last page the caller finished is
+    # saved before the next page is fetched, so an interrupted run resumes there.
+    # `finished` blocks until the caller's work on that page is done and returns
+    # False if it failed; the walk then stops without moving the checkpoint.
+    # Offsets shift when new activities are uploaded mid-backfill; the overlap is
+    # harmless because the sync only creates what does not exist yet.
+    start = load_checkpoint(checkpoint_file) if checkpoint_file else 0
+    if start:
+        print(f"Resuming activity backfill at offset {start}")
+
+    while limit is None or start < limit:
+        count = page_size if limit is None else min(page_size, limit - start)
+        page = garmin.get_activities(start, count)
+        if not page:
+            break
+        yield page
+        if finished and not finished():
+            print(f"⚠️ Stopping the activity backfill; the next run resumes at offset {start}")
+            return
+        start += len(page)
+        if checkpoint_file:
+            save_checkpoint(checkpoint_file, start)
+        if len(page) < count:
+            break
+
+    # The whole history was walked, the next backfill starts from scratch
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
 
 def format_activity_type(activity_type, activity_name=""):
     # First format the activity type as before
@@ -107,187 +160,334 @@ def format_pace(average_speed):
     else:
         return ""
     
-def activity_exists(client, database_id, activity_date, activity_type, activity_name):
+def activity_key(activity_date, activity_type, activity_name):
 
-    # Check if an activity already exists in the Notion database and return it if found.
+    # Build the (date, main type, name) key used to match Garmin activities against Notion pages
 
     # Handle the activity_type which is now a tuple
     if isinstance(activity_type, tuple):
         main_type, _ = activity_type
     else:
         main_type = activity_type[0] if isinstance(activity_type, (list, tuple)) else activity_type
-    
+
     # Determine the correct activity type for the lookup
     lookup_type = "Stretching" if "stretch" in activity_name.lower() else main_type
-    
-    query = client.databases.query(
+
+    return (activity_date[:10], lookup_type, activity_name)
+
+def build_activity_index(client, database_id, start_date, end_date=None):
+
+    # Scan the Notion database once for the sync window and index every page by activity_key
+
+    date_filters = [{"property": "Date", "date": {"on_or_after": start_date[:10]}}]
+    if end_date:
+        date_filters.append({"property": "Date", "date": {"on_or_before": end_date[:10]}})
+
+    index = {}
+    for page in iterate_paginated_api(
+        client.databases.query,
         database_id=database_id,
-        filter={
-            "and": [
-                {"property": "Date", "date": {"equals": activity_date.split('T')[0]}},
-                {"property": "Activity Type", "select": {"equals": lookup_type}},
-                {"property": "Activity Name", "title": {"equals": activity_name}}
-            ]
-        }
-    )
-    results = query['results']
-    return results[0] if results else None
-
-
-def activity_needs_update(existing_activity, new_activity):
+        filter={"and": date_filters},
+        page_size=100
+    ):
+        props = page['properties']
+        date_prop = props.get('Date', {}).get('date') or {}
+        type_prop = props.get('Activity Type', {}).get('select') or {}
+        title = props.get('Activity Name', {}).get('title') or []
+        if not date_prop.get('start'):
+            continue
+        name = ''.join(part.get('plain_text', '') for part in title)
+        key = (date_prop['start'][:10], type_prop.get('name'), name)
+        # Keep the first match, like the per-activity query used to
+        index.setdefault(key, page)
+    return index
+
+def activity_exists(activity_index, activity_date, activity_type, activity_name):
+
+    # Check if an activity already exists in the Notion database and return it if found.
+    return activity_index.get(activity_key(activity_date, activity_type, activity_name))
+
+
+def format_activity(activity):
+
+    # Name and (main type, subtype) are needed by several fields, compute them once
+    activity_name = format_entertainment(activity.activityName)
+    activity_type, activity_subtype = format_activity_type(activity.typeKey, activity_name)
+    return {"name": activity_name, "type": activity_type, "subtype": activity_subtype}
+
+# Garmin activity -> Notion property mapping: (property, Notion type, value getter).
+# Getters receive the ActivityRecord (see activity_record.py) and the output of format_activity().
+ACTIVITY_FIELDS = [
+    ("Date", "date", lambda a, f: a.startTimeGMT),
+    ("Activity Type", "select", lambda a, f: f["type"]),
+    ("Subactivity Type", "select", lambda a, f: f["subtype"]),
+    ("Activity Name", "title", lambda a, f: f["name"]),
+    ("Distance (km)", "number", lambda a, f: round(a.distance / 1000, 2)),
+    ("Duration (min)", "number", lambda a, f: round(a.duration / 60, 2)),
+    ("Calories", "number", lambda a, f: round(a.calories)),
+    ("Avg Pace", "rich_text", lambda a, f: format_pace(a.averageSpeed)),
+    ("Avg Power", "number", lambda a, f: round(a.avgPower, 1)),
+    ("Max Power", "number", lambda a, f: round(a.maxPower, 1)),
+    ("Training Effect", "select", lambda a, f: format_training_effect(a.trainingEffectLabel)),
+    ("Aerobic", "number", lambda a, f: round(a.aerobicTrainingEffect, 1)),
+    ("Aerobic Effect", "select", lambda a, f: format_training_message(a.aerobicTrainingEffectMessage)),
+    ("Anaerobic", "number", lambda a, f: round(a.anaerobicTrainingEffect, 1)),
+    ("Anaerobic Effect", "select", lambda a, f: format_training_message(a.anaerobicTrainingEffectMessage)),
+    ("PR", "checkbox", lambda a, f: a.pr),
+    ("Fav", "checkbox", lambda a, f: a.favorite),
+]
+
+ACTIVITY_FIELD_TYPES = {prop: kind for prop, kind, _ in ACTIVITY_FIELDS}
+
+# Every mapped property must exist in the database with this type
+NOTION_SCHEMA = ACTIVITY_FIELD_TYPES
+
+# Summary fields plus the ones added by detail enrichment (see activity_details.py)
+FIELD_TYPES = {**ACTIVITY_FIELD_TYPES, **DETAIL_FIELD_TYPES}
+
+# Notion normalises datetimes, so the page's Date never compares equal to startTimeGMT.
+# It identifies the activity and is never updated.
+NOT_COMPARED = {"Date"}
+
+def to_notion_property(kind, value):
+    if kind in ("title", "rich_text"):
+        return {kind: [{"text": {"content": value}}]}
+    if kind == "select":
+        return {"select": {"name": value}}
+    if kind == "date":
+        return {"date": {"start": value}}
+    return {kind: value}
+
+def from_notion_property(kind, prop):
+
+    # Read the plain value of a page property, None if it is missing or empty
+    if not prop:
+        return None
+    if kind in ("title", "rich_text"):
+        return ''.join(part.get('plain_text', part.get('text', {}).get('content', '')) for part in prop.get(kind) or [])
+    if kind == "select":
+        return (prop.get('select') or {}).get('name')
+    if kind == "date":
+        return (prop.get('date') or {}).get('start')
+    return prop.get(kind)
+
+def activity_values(activity):
+
+    # Evaluate the field mapping once per activity
+    formatted = format_activity(activity)
+    return {prop: getter(activity, formatted) for prop, _, getter in ACTIVITY_FIELDS}
+
+def activity_icon(values):
+    activity_type, activity_subtype = values["Activity Type"], values["Subactivity Type"]
+    return ACTIVITY_ICONS.get(activity_subtype if activity_subtype != activity_type else activity_type)
+
+def changed_fields(old_values, values):
+    return [
+        prop for prop in values
+        if prop not in NOT_COMPARED and (old_values is None or old_values.get(prop) != values[prop])
+    ]
+
+def page_values(existing_activity):
+    # run_sync checks the schema first, so a None here is an empty property, not a missing one
     existing_props = existing_activity['properties']
-    
-    activity_name = new_activity.get('activityName', '').lower()
-    activity_type, activity_subtype = format_activity_type(
-        new_activity.get('activityType', {}).get('typeKey', 'Unknown'),
-        activity_name
-    )
-    
-    # Check if 'Subactivity Type' property exists
-    has_subactivity = (
-        'Subactivity Type' in existing_props and 
-        existing_props['Subactivity Type'] is not None and
-        existing_props['Subactivity Type'].get('select') is not None
-    )
-    
-    return (
-        existing_props['Distance (km)']['number'] != round(new_activity.get('distance', 0) / 1000, 2) or
-        existing_props['Duration (min)']['number'] != round(new_activity.get('duration', 0) / 60, 2) or
-        existing_props['Calories']['number'] != round(new_activity.get('calories', 0)) or
-        existing_props['Avg Pace']['rich_text'][0]['text']['content'] != format_pace(new_activity.get('averageSpeed', 0)) or
-        existing_props['Avg Power']['number'] != round(new_activity.get('avgPower', 0), 1) or
-        existing_props['Max Power']['number'] != round(new_activity.get('maxPower', 0), 1) or
-        existing_props['Training Effect']['select']['name'] != format_training_effect(new_activity.get('trainingEffectLabel', 'Unknown')) or
-        existing_props['Aerobic']['number'] != round(new_activity.get('aerobicTrainingEffect', 0), 1) or
-        existing_props['Aerobic Effect']['select']['name'] != format_training_message(new_activity.get('aerobicTrainingEffectMessage', 'Unknown')) or
-        existing_props['Anaerobic']['number'] != round(new_activity.get('anaerobicTrainingEffect', 0), 1) or
-        existing_props['Anaerobic Effect']['select']['name'] != format_training_message(new_activity.get('anaerobicTrainingEffectMessage', 'Unknown')) or
-        existing_props['PR']['checkbox'] != new_activity.get('pr', False) or
-        existing_props['Fav']['checkbox'] != new_activity.get('favorite', False) or
-        existing_props['Activity Type']['select']['name'] != activity_type or
-        (has_subactivity and existing_props['Subactivity Type']['select']['name'] != activity_subtype) or
-        (not has_subactivity)  # If the property doesn't exist, we need an update
-    )
-
-def create_activity(client, database_id, activity):
+    return {prop: from_notion_property(kind, existing_props.get(prop)) for prop, kind in FIELD_TYPES.items()}
+
+def create_activity(writer, database_id, values, on_success=None):
 
     # Create a new activity in the Notion database
-    activity_date = activity.get('startTimeGMT')
-    activity_name = format_entertainment(activity.get('activityName', 'Unnamed Activity'))
-    activity_type, activity_subtype = format_activity_type(
-        activity.get('activityType', {}).get('typeKey', 'Unknown'),
-        activity_name
-    )
-    
-    # Get icon for the activity type
-    icon_url = ACTIVITY_ICONS.get(activity_subtype if activity_subtype != activity_type else activity_type)
-    
-    properties = {
-        "Date": {"date": {"start": activity_date}},
-        "Activity Type": {"select": {"name": activity_type}},
-        "Subactivity Type": {"select": {"name": activity_subtype}},
-        "Activity Name": {"title": [{"text": {"content": activity_name}}]},
-        "Distance (km)": {"number": round(activity.get('distance', 0) / 1000, 2)},
-        "Duration (min)": {"number": round(activity.get('duration', 0) / 60, 2)},
-        "Calories": {"number": round(activity.get('calories', 0))},
-        "Avg Pace": {"rich_text": [{"text": {"content": format_pace(activity.get('averageSpeed', 0))}}]},
-        "Avg Power": {"number": round(activity.get('avgPower', 0), 1)},
-        "Max Power": {"number": round(activity.get('maxPower', 0), 1)},
-        "Training Effect": {"select": {"name": format_training_effect(activity.get('trainingEffectLabel', 'Unknown'))}},
-        "Aerobic": {"number": round(activity.get('aerobicTrainingEffect', 0), 1)},
-        "Aerobic Effect": {"select": {"name": format_training_message(activity.get('aerobicTrainingEffectMessage', 'Unknown'))}},
-        "Anaerobic": {"number": round(activity.get('anaerobicTrainingEffect', 0), 1)},
-        "Anaerobic Effect": {"select": {"name": format_training_message(activity.get('anaerobicTrainingEffectMessage', 'Unknown'))}},
-        "PR": {"checkbox": activity.get('pr', False)},
-        "Fav": {"checkbox": activity.get('favorite', False)}
-    }
-    
     page = {
         "parent": {"database_id": database_id},
-        "properties": properties,
+        "properties": {prop: to_notion_property(FIELD_TYPES[prop], value) for prop, value in values.items()},
     }
     
+    icon_url = activity_icon(values)
     if icon_url:
         page["icon"] = {"type": "external", "external": {"url": icon_url}}
     
-    client.pages.create(**page)
-    
-def update_activity(client, existing_activity, new_activity):
-
-    # Update an existing activity in the Notion database with new data
-    activity_name = new_activity.get('activityName', 'Unnamed Activity')
-    activity_type, activity_subtype = format_activity_type(
-        new_activity.get('activityType', {}).get('typeKey', 'Unknown'),
-        activity_name
-    )
-    
-    # Get icon for the activity type
-    icon_url = ACTIVITY_ICONS.get(activity_subtype if activity_subtype != activity_type else activity_type)
-    
-    properties = {
-        "Activity Type": {"select": {"name": activity_type}},
-        "Subactivity Type": {"select": {"name": activity_subtype}},
-        "Distance (km)": {"number": round(new_activity.get('distance', 0) / 1000, 2)},
-        "Duration (min)": {"number": round(new_activity.get('duration', 0) / 60, 2)},
-        "Calories": {"number": round(new_activity.get('calories', 0))},
-        "Avg Pace": {"rich_text": [{"text": {"content": format_pace(new_activity.get('averageSpeed', 0))}}]},
-        "Avg Power": {"number": round(new_activity.get('avgPower', 0), 1)},
-        "Max Power": {"number": round(new_activity.get('maxPower', 0), 1)},
-        "Training Effect": {"select": {"name": format_training_effect(new_activity.get('trainingEffectLabel', 'Unknown'))}},
-        "Aerobic": {"number": round(new_activity.get('aerobicTrainingEffect', 0), 1)},
-        "Aerobic Effect": {"select": {"name": format_training_message(new_activity.get('aerobicTrainingEffectMessage', 'Unknown'))}},
-        "Anaerobic": {"number": round(new_activity.get('anaerobicTrainingEffect', 0), 1)},
-        "Anaerobic Effect": {"select": {"name": format_training_message(new_activity.get('anaerobicTrainingEffectMessage', 'Unknown'))}},
-        "PR": {"checkbox": new_activity.get('pr', False)},
-        "Fav": {"checkbox": new_activity.get('favorite', False)}
-    }
+    return writer.create(on_success=on_success, **page)
     
+def update_activity(writer, page_id, values, changed, on_success=None):
+
+    # PATCH only the properties that changed; the icon only follows a type change
     update = {
-        "page_id": existing_activity['id'],
-        "properties": properties,
+        "page_id": page_id,
+        "properties": {prop: to_notion_property(FIELD_TYPES[prop], values[prop]) for prop in changed},
     }
     
-    if icon_url:
+    icon_url = activity_icon(values)
+    if icon_url and ({"Activity Type", "Subactivity Type"} & set(changed)):
         update["icon"] = {"type": "external", "external": {"url": icon_url}}
         
-    client.pages.update(**update)
+    return writer.update(on_success=on_success, **update)
 
-def main():
-    load_dotenv()
+def activity_row(activity, values):
 
-    # Initialize Garmin and Notion clients using environment variables
-    garmin_email = os.getenv("GARMIN_EMAIL")
-    garmin_password = os.getenv("GARMIN_PASSWORD")
-    notion_token = os.getenv("NOTION_TOKEN")
-    database_id = os.getenv("NOTION_DB_ID")
+    # The analytics store row; activities are grouped by their local start date
+    start_local = activity.startTimeLocal or values["Date"] or ""
+    return {
+        "activity_id": activity.activityId,
+        "date": start_local[:10],
+        "start_time": values["Date"],
+        "activity_type": values["Activity Type"],
+        "subactivity_type": values["Subactivity Type"],
+        "name": values["Activity Name"],
+        "distance_km": values["Distance (km)"],
+        "duration_min": values["Duration (min)"],
+        "calories": values["Calories"],
+        "avg_power": values["Avg Power"],
+        "aerobic_effect": values["Aerobic"],
+        "anaerobic_effect": values["Anaerobic"],
+    }
 
-    # Initialize Garmin client and login
-    garmin = Garmin(garmin_email, garmin_password)
-    garmin.login()
-    client = Client(auth=notion_token)
-    
-    # Get all activities
-    activities = get_all_activities(garmin, limit=10)
+def sync_activities(client, plan, ledger, database_id, activities, store=None, details=None):
+
+    # Add the operations that bring Notion in line with this batch to the plan
+    activity_index = None
+    rows = []
 
     # Process all activities
     for activity in activities:
-        activity_date = activity.get('startTimeGMT')
-        activity_name = format_entertainment(activity.get('activityName', 'Unnamed Activity'))
-        activity_type, activity_subtype = format_activity_type(
-            activity.get('activityType', {}).get('typeKey', 'Unknown'),
-            activity_name
-        )
-        
-        # Check if activity already exists in Notion
-        existing_activity = activity_exists(client, database_id, activity_date, activity_type, activity_name)
+        activity_id = activity.activityId
+        values = activity_values(activity)
+        # Detail properties go out in the same create/update as the summary fields
+        if details and activity_id in details:
+            values.update(details[activity_id])
+        digest = payload_hash(values)
+        if activity_id:
+            rows.append(activity_row(activity, values))
+        synced = ledger.get("activity", activity_id) if activity_id else None
+
+        def record_page(page, activity_id=activity_id, values=values, digest=digest):
+            if activity_id:
+                ledger.record("activity", activity_id, page['id'], digest, values)
+
+        # Known to the ledger: skip unchanged activities, update changed ones directly
+        if synced:
+            page_id, synced_digest = synced
+            if synced_digest != digest:
+                changed = changed_fields(ledger.last_payload("activity", activity_id), values)
+                update_activity(plan, page_id, values, changed, on_success=record_page)
+            else:
+                plan.noop(f"{values['Date']} {values['Activity Name']}")
+            continue
+
+        activity_type = (values["Activity Type"], values["Subactivity Type"])
+        activity_name = values["Activity Name"]
+
+        # Without a start time there is nothing to look it up by; treat the activity as new
+        existing_activity = None
+        if activity.startTimeGMT:
+            # Read the existing pages for this batch's date window in one paginated scan,
+            # only once some dated activity is missing from the ledger
+            if activity_index is None:
+                activity_dates = [a.startTimeGMT for a in activities if a.startTimeGMT]
+                activity_index = build_activity_index(client, database_id, min(activity_dates), max(activity_dates))
+
+            # Check if activity already exists in Notion
+            existing_activity = activity_exists(activity_index, values["Date"], activity_type, activity_name)
         
         if existing_activity:
-            if activity_needs_update(existing_activity, activity):
-                update_activity(client, existing_activity, activity)
+            changed = changed_fields(page_values(existing_activity), values)
+            if changed:
+                update_activity(plan, existing_activity['id'], values, changed, on_success=record_page)
                 # print(f"Updated: {activity_type} - {activity_name}")
+            else:
+                plan.noop(f"{values['Date']} {activity_name}", on_success=record_page, page=existing_activity)
         else:
-            create_activity(client, database_id, activity)
+            create_activity(plan, database_id, values, on_success=record_page)
             # print(f"Created: {activity_type} - {activity_name}")
 
+    if store and rows:
+        store.add("activities", rows)
+
+def newest_activity(activities, mark=None):
+
+    # The high-water mark: startTimeGMT and activityId of the newest activity seen
+    newest = mark
+    for activity in activities:
+        candidate = {"startTimeGMT": activity.startTimeGMT, "activityId": activity.activityId}
+        if candidate["startTimeGMT"] and (newest is None or
+                (candidate["startTimeGMT"], candidate["activityId"] or 0) > (newest["startTimeGMT"], newest["activityId"] or 0)):
+            newest = candidate
+    return newest
+
+def get_activities_since(garmin, mark, lookback_days):
+
+    # Everything started after the mark, plus a lookback window for late edits
+    # (renames, favorites). One extra day covers the GMT/local date offset.
+    mark_time = datetime.strptime(mark["startTimeGMT"][:10], "%Y-%m-%d")
+    since = mark_time - timedelta(days=lookback_days + 1)
+    return garmin.get_activities_by_date(since.strftime("%Y-%m-%d"))
+
+def run_sync(garmin, client, writer, ledger, database_id, store=None):
+
+    # GARMIN_ENRICH_ACTIVITIES adds laps, splits and HR zone times from the detail endpoints
+    enrich = enrichment_enabled()
+    check_schema(client, database_id, FIELD_TYPES if enrich else NOTION_SCHEMA, "Activities database")
+
+    # GARMIN_BACKFILL walks the full history and can resume after an interrupted run
+    backfill = os.getenv("GARMIN_BACKFILL", "").lower() in ("1", "true", "yes")
+    limit = None if backfill else int(os.getenv("GARMIN_ACTIVITIES_LIMIT", "10"))
+    page_size = int(os.getenv("GARMIN_ACTIVITIES_PAGE_SIZE", "100"))
+    dry = dry_run()
+    # A dry run must not move the backfill checkpoint or the mark
+    checkpoint_file = state_path("activities-backfill.json") if backfill and not dry else None
+    lookback_days = int(os.getenv("GARMIN_ACTIVITIES_LOOKBACK_DAYS", "3"))
+    mark = ledger.get_state("activities.high_water_mark")
+
+    # Plan each batch against Notion, then apply it before the next page is fetched
+    plan = SyncPlan("Activities")
+
+    if mark and not backfill:
+        # Incremental run: only activities newer than the mark, plus the lookback window
+        activities = project_activities(get_activities_since(garmin, mark, lookback_days))
+        batches = (activities[start:start + page_size] for start in range(0, len(activities), page_size))
+    else:
+        # Process activities page by page so memory stays flat however long the history is;
+        # each page is projected to compact records as soon as it arrives. The checkpoint
+        # only moves past a page once all of its writes reached Notion.
+        finished = plan.wait if checkpoint_file else None
+        pages = iter_activity_pages(garmin, limit, page_size, checkpoint_file, finished)
+        batches = (project_activities(page) for page in pages)
+
+    writes = 0
+    newest = mark
+    activity_details = ActivityDetails() if enrich else None
+    try:
+        for activities in batches:
+            details = activity_details.enrich(garmin, activities) if activity_details else None
+            sync_activities(client, plan, ledger, database_id, activities, store, details)
+            if not dry:
+                writes += plan.apply(writer)
+            newest = newest_activity(activities, newest)
+    finally:
+        if activity_details:
+            activity_details.close()
+
+    if dry:
+        plan.report()
+        return plan.writes()
+
+    # Advance the mark only once every queued write for this run has succeeded
+    if plan.wait() and newest != mark:
+        ledger.set_state("activities.high_water_mark", newest)
+    return writes
+
+def main():
+    load_dotenv()
+
+    # Initialize Garmin and Notion clients using environment variables
+    garmin_email = os.getenv("GARMIN_EMAIL")
+    garmin_password = os.getenv("GARMIN_PASSWORD")
+    notion_token = os.getenv("NOTION_TOKEN")
+    database_id = os.getenv("NOTION_DB_ID")
+
+    # Initialize Garmin client, reusing the saved session when possible
+    garmin = get_garmin(garmin_email, garmin_password)
+
+    with SyncLedger() as ledger, AnalyticsStore() as store, NotionWriter(auth=notion_token, journal=ledger) as writer:
+        client = resilient_notion(Client(auth=notion_token), limiter=writer)
+        run_sync(garmin, client, writer, ledger, database_id, store)
+
 if __name__ == '__main__':
     main()
@@ -1,12 +1,11 @@
-from garminconnect import Garmin
+from garmin_session import get_garmin
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import os
 
 # Load credentials
 load_dotenv()
-garmin = Garmin(os.getenv("GARMIN_EMAIL"), os.getenv("GARMIN_PASSWORD"))
-garmin.login()
+garmin = get_garmin(os.getenv("GARMIN_EMAIL"), os.getenv("GARMIN_PASSWORD"))
 
 # Target date: yesterday
 date = datetime.today() - timedelta(days=1)
@@ -3,7 +3,7 @@ import json
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-from garminconnect import Garmin
+from garmin_session import get_garmin
 
 # ---------------------------------------------------------
 # CONFIG
@@ -23,8 +23,7 @@ today = now.date().isoformat()
 
 print(f"Connecting to Garmin for {today}...")
 
-client = Garmin(GARMIN_EMAIL, GARMIN_PASSWORD)
-client.login()
+client = get_garmin(GARMIN_EMAIL, GARMIN_PASSWORD)
 
 print("Garmin login successful.")
 
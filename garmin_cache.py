@@ -0,0 +1,194 @@
+"""
+On-disk cache for Garmin Connect day data.
+
+Responses of the per-day endpoints (sleep, stress, hydration, heart rate,
+daily summary, steps, weight) are stored as content-addressed JSON blobs
+under GARMIN_CACHE_DIR (default `SYNC_STATE_DIR/garmin-cache`), with a SQLite
+index keyed by endpoint and arguments. Days older than
+GARMIN_CACHE_IMMUTABLE_DAYS are treated as final and never expire; more
+recent days are refetched after GARMIN_CACHE_TTL seconds. Least recently
+used entries are evicted once the blobs exceed GARMIN_CACHE_MAX_MB.
+Set GARMIN_CACHE=false to bypass the cache.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from sync_state import state_path
+
+IMMUTABLE_AFTER_DAYS = 3
+RECENT_TTL_SECONDS = 600
+MAX_CACHE_MB = 256
+
+# Cached Garmin methods -> the day their response describes, from the call arguments
+CACHED_METHODS = {
+    "get_sleep_data": lambda cdate: cdate,
+    "get_stress_data": lambda cdate: cdate,
+    "get_hydration_data": lambda cdate: cdate,
+    "get_heart_rates": lambda cdate: cdate,
+    "get_user_summary": lambda cdate: cdate,
+    "get_stats": lambda cdate: cdate,
+    "get_hrv_data": lambda cdate: cdate,
+    "get_steps_data": lambda cdate: cdate,
+    "get_daily_steps": lambda start, end: end,
+    "get_body_composition": lambda startdate, enddate=None: enddate or startdate,
+}
+
+
+def cache_enabled():
+    return os.getenv("GARMIN_CACHE", "true").lower() not in ("0", "false", "no")
+
+
+class GarminCache:
+    """Content-addressed response store with TTL for recent days and LRU eviction."""
+
+    def __init__(self, path=None, immutable_after_days=None, ttl=None, max_bytes=None):
+        self.path = path or os.getenv("GARMIN_CACHE_DIR") or state_path("garmin-cache")
+        self.immutable_after_days = int(immutable_after_days if immutable_after_days is not None
+                                        else os.getenv("GARMIN_CACHE_IMMUTABLE_DAYS", IMMUTABLE_AFTER_DAYS))
+        self.ttl = float(ttl if ttl is not None else os.getenv("GARMIN_CACHE_TTL", RECENT_TTL_SECONDS))
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else float(os.getenv("GARMIN_CACHE_MAX_MB", MAX_CACHE_MB)) * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.join(self.path, "blobs"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.path, "index.sqlite3"), check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    blob TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    day TEXT,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_blob ON entries (blob)")
+            # Bytes of the blobs entries refer to, kept up to date by put() and evict()
+            self.total_bytes = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM entries GROUP BY blob)"
+            ).fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _blob_path(self, blob):
+        return os.path.join(self.path, "blobs", blob[:2], blob)
+
+    def is_immutable(self, day):
+        try:
+            return date.fromisoformat(str(day)[:10]) < date.today() - timedelta(days=self.immutable_after_days)
+        except ValueError:
+            return False
+
+    def get(self, key, day):
+        # Return (True, value) on a fresh hit, (False, None) otherwise
+        with self.lock:
+            row = self.conn.execute("SELECT blob, fetched_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        blob, fetched_at = row
+        if not self.is_immutable(day) and time.time() - fetched_at > self.ttl:
+            return False, None
+        try:
+            with open(self._blob_path(blob), "rb") as f:
+                value = json.loads(f.read())
+        except (OSError, ValueError):
+            return False, None
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return True, value
+
+    def _referenced(self, blob):
+        return self.conn.execute("SELECT 1 FROM entries WHERE blob = ? LIMIT 1", (blob,)).fetchone() is not None
+
+    def _drop_blob(self, blob, size):
+        # Called once the last entry referring to the blob is gone
+        self.total_bytes -= size
+        try:
+            os.remove(self._blob_path(blob))
+        except OSError:
+            pass
+
+    def put(self, key, day, value):
+        data = json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        blob = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(blob)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        now = time.time()
+        with self.lock, self.conn:
+            replaced = self.conn.execute("SELECT blob, size FROM entries WHERE key = ?", (key,)).fetchone()
+            new_blob = not self._referenced(blob)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, blob, size, day, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, len(data), day, now, now),
+            )
+            if new_blob:
+                self.total_bytes += len(data)
+            if replaced and replaced[0] != blob and not self._referenced(replaced[0]):
+                self._drop_blob(*replaced)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Drop least recently used entries, and blobs nothing refers to, until under the size cap
+        with self.lock, self.conn:
+            if self.total_bytes <= self.max_bytes:
+                return
+            for key, blob, size in self.conn.execute("SELECT key, blob, size FROM entries ORDER BY accessed_at").fetchall():
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                if not self._referenced(blob):
+                    self._drop_blob(blob, size)
+                if self.total_bytes <= self.max_bytes:
+                    return
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class CachedGarmin:
+    """Garmin client proxy that answers the day-data getters from a GarminCache."""
+
+    def __init__(self, garmin, cache):
+        self.wrapped = garmin
+        self.cache = cache
+
+    def __getattr__(self, name):
+        method = getattr(self.wrapped, name)
+        day_of = CACHED_METHODS.get(name)
+        if day_of is None:
+            return method
+
+        def cached(*args, **kwargs):
+            key = json.dumps([name, args, kwargs], sort_keys=True, default=str)
+            day = day_of(*args, **kwargs)
+            hit, value = self.cache.get(key, day)
+            if hit:
+                self.cache.hits += 1
+                return value
+            self.cache.misses += 1
+            value = method(*args, **kwargs)
+            # Empty answers may just mean the device has not synced yet
+            if value:
+                self.cache.put(key, day, value)
+            return value
+
+        return cached
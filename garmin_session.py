@@ -0,0 +1,48 @@
+"""
+Garmin Connect login that reuses a saved session.
+
+The OAuth tokens of an authenticated session are stored in GARMIN_TOKEN_DIR
+(default `SYNC_STATE_DIR/garmin-tokens`). Later scripts and later runs load
+them instead of going through SSO again; garth refreshes the short-lived
+OAuth2 token from the stored OAuth1 token when it expires, and the refreshed
+tokens are written back. A full login only happens when there is no usable
+session on disk.
+
+The returned client retries transient errors (resilience.py) and answers
+past-day data from the on-disk response cache in garmin_cache.py unless
+GARMIN_CACHE=false.
+"""
+import os
+
+from garminconnect import (
+    Garmin,
+    GarminConnectAuthenticationError,
+    GarminConnectConnectionError,
+)
+from garth.exc import GarthException
+
+from garmin_cache import CachedGarmin, GarminCache, cache_enabled
+from resilience import RetryingGarmin
+from sync_state import state_path
+
+
+def token_dir():
+    return os.path.expanduser(os.getenv("GARMIN_TOKEN_DIR") or state_path("garmin-tokens"))
+
+
+def get_garmin(email=None, password=None):
+    email = email or os.getenv("GARMIN_EMAIL")
+    password = password or os.getenv("GARMIN_PASSWORD")
+    tokenstore = token_dir()
+
+    garmin = Garmin(email, password)
+    try:
+        garmin.login(tokenstore)
+    except (FileNotFoundError, GarthException, GarminConnectAuthenticationError, GarminConnectConnectionError):
+        # No saved session, or it can no longer be refreshed
+        garmin = Garmin(email, password)
+        garmin.login()
+
+    garmin.garth.dump(tokenstore)
+    garmin = RetryingGarmin(garmin)
+    return CachedGarmin(garmin, GarminCache()) if cache_enabled() else garmin
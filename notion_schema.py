@@ -0,0 +1,82 @@
+"""
+Notion database schemas and the preflight check run before a sync writes.
+
+Each sync script declares NOTION_SCHEMA, the properties it writes and their
+Notion types. check_schema() compares it with the live database and raises
+SchemaError listing every missing or mistyped property, so a renamed column
+stops the sync before any page is written. Retrieved schemas are cached in
+`SYNC_STATE_DIR/notion-schemas.json` for NOTION_SCHEMA_TTL seconds (default
+one day); a failing check re-reads the schema once before giving up, so a
+fixed database is picked up immediately.
+"""
+import json
+import os
+import threading
+import time
+
+from sync_state import state_path
+
+SCHEMA_TTL_SECONDS = 24 * 3600
+
+_lock = threading.Lock()
+
+
+class SchemaError(Exception):
+    """The Notion database does not have the properties a sync writes."""
+
+
+def schema_cache_path():
+    return state_path("notion-schemas.json")
+
+
+def _load_cache():
+    try:
+        with open(schema_cache_path()) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    path = schema_cache_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def get_schema(client, database_id, refresh=False):
+    # {property name: property type} for a database, from the cache while it is fresh
+    ttl = float(os.getenv("NOTION_SCHEMA_TTL", SCHEMA_TTL_SECONDS))
+    with _lock:
+        cached = _load_cache().get(database_id)
+    if cached and not refresh and time.time() - cached["fetched_at"] < ttl:
+        return cached["properties"]
+
+    response = client.databases.retrieve(database_id=database_id)
+    properties = {name: prop["type"] for name, prop in response["properties"].items()}
+    with _lock:
+        cache = _load_cache()
+        cache[database_id] = {"fetched_at": time.time(), "properties": properties}
+        _save_cache(cache)
+    return properties
+
+
+def schema_problems(actual, expected):
+    problems = []
+    for name, kind in expected.items():
+        if name not in actual:
+            problems.append(f"missing property '{name}' ({kind})")
+        elif actual[name] != kind:
+            problems.append(f"property '{name}' is {actual[name]}, expected {kind}")
+    return problems
+
+
+def check_schema(client, database_id, expected, label="Notion database"):
+    problems = schema_problems(get_schema(client, database_id), expected)
+    if problems:
+        # The cached schema may predate a fix, check the live one before failing
+        problems = schema_problems(get_schema(client, database_id, refresh=True), expected)
+    if problems:
+        raise SchemaError(f"{label} {database_id} does not match the sync: " + "; ".join(problems))
@@ -1,20 +1,37 @@
+from notion_client import Client
 from dotenv import load_dotenv
-import json
+import os
 
-# Load Notion token and database ID
+from notion_schema import get_schema, schema_problems
+from sync_runner import SYNCS, load_script
+
+# The rollup summaries are written by rollups.py, next to the syncs
+CHECKS = SYNCS + [("rollups", "rollups.py", "NOTION_ROLLUP_DB_ID")]
+
+# Load Notion token
 load_dotenv()
 notion_token = os.getenv("NOTION_TOKEN")
-database_id = os.getenv("NOTION_SLEEP_DB_ID")Add commentMore actions
 
 # Initialize Notion client
 client = Client(auth=notion_token)
 
-# Fetch and display the database schema
-try:
-    response = client.databases.retrieve(database_id=database_id)
-    print("\n📘 Notion Database Schema:")
-    for prop_name, prop in response['properties'].items():
-        prop_type = prop['type']
-        print(f"- {prop_name}: {prop_type}")
-except Exception as e:
-    print("❌ Failed to fetch schema:", e)
+# Fetch and display each configured database schema, checked against what the sync writes
+for name, filename, env_var in CHECKS:
+    database_id = os.getenv(env_var)
+    if not database_id:
+        continue
+    try:
+        schema = get_schema(client, database_id, refresh=True)
+        print(f"\n📘 Notion Database Schema ({name}, {env_var}):")
+        for prop_name, prop_type in schema.items():
+            print(f"- {prop_name}: {prop_type}")
+
+        problems = schema_problems(schema, load_script(filename).NOTION_SCHEMA)
+        if problems:
+            print(f"❌ {name} sync would fail:")
+            for problem in problems:
+                print(f"   - {problem}")
+        else:
+            print(f"✅ Matches the {name} sync")
+    except Exception as e:
+        print("❌ Failed to fetch schema:", e)
@@ -0,0 +1,222 @@
+"""
+Shared write queue for the Notion API.
+
+Page creates and updates are handed to a NotionWriter, which sends them with
+notion_client's AsyncClient on a background event loop. A token bucket keeps
+the request rate at Notion's limit, a semaphore caps the number of requests in
+flight, and 429 responses pause the whole queue for the Retry-After interval.
+Reads sent with the synchronous client take their tokens from the same bucket
+through throttle() (see resilient_notion), so the integration stays under the
+limit as a whole.
+Other retryable errors (see resilience.py) are retried with jittered backoff;
+creates only when Notion surely did not process them.
+With a journal (the SyncLedger), writes identical to one that already
+completed in the same run are answered from the journal instead of being
+sent again, so a run restarted after a crash skips what it already did.
+finish_run() (and leaving the `with` block normally) ends the run and
+clears its journal.
+The sync scripts stay synchronous: every write returns a concurrent Future.
+"""
+import asyncio
+import threading
+import time
+
+from notion_client import AsyncClient
+from notion_client.errors import HTTPResponseError
+
+from api_metrics import METRICS, count_async_response
+from resilience import backoff_delay, is_retryable, retry_after_seconds
+from sync_state import payload_hash
+
+# Notion allows an average of three requests per second per integration
+NOTION_REQUESTS_PER_SECOND = 3
+MAX_IN_FLIGHT = 4
+MAX_PENDING = 200
+MAX_RETRIES = 5
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        # Stop handing out tokens, e.g. after a 429 with Retry-After
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        # Refill from the end of the pause, not from before it
+        self.updated = self.paused_until
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NotionWriter:
+    """
+    Concurrent, rate-limited writer for pages.create / pages.update.
+
+    Use it as a context manager; leaving the block waits for every queued write.
+    Writes submitted without an `on_error` callback are expected to succeed, and
+    the first of them that fails is re-raised by close().
+    """
+
+    def __init__(self, auth, rate=NOTION_REQUESTS_PER_SECOND, burst=NOTION_REQUESTS_PER_SECOND,
+                 max_in_flight=MAX_IN_FLIGHT, max_pending=MAX_PENDING, max_retries=MAX_RETRIES,
+                 metrics=METRICS, journal=None, **client_options):
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.journal = journal
+        self.run_id = journal.begin_run() if journal else None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="notion-writer", daemon=True)
+        self.thread.start()
+
+        async def setup():
+            self.client = AsyncClient(auth=auth, **client_options)
+            self.client.client.event_hooks["response"].append(count_async_response)
+            self.bucket = TokenBucket(rate, burst)
+            self.in_flight = asyncio.Semaphore(max_in_flight)
+
+        asyncio.run_coroutine_threadsafe(setup(), self.loop).result()
+
+        # Bound the backlog so a large backfill cannot queue unlimited payloads
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.futures = set()
+        self.futures_lock = threading.Lock()
+        self.errors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.finish_run()
+        self.close(raise_errors=exc_type is None)
+
+    def create(self, on_success=None, on_error=None, **kwargs):
+        return self.submit("pages.create", on_success, on_error, **kwargs)
+
+    def update(self, on_success=None, on_error=None, **kwargs):
+        return self.submit("pages.update", on_success, on_error, **kwargs)
+
+    def archive(self, on_success=None, on_error=None, **kwargs):
+        # An update that retires a page; SyncPlan tells the two apart
+        return self.submit("pages.update", on_success, on_error, **kwargs)
+
+    def throttle(self):
+        # Block until the bucket hands out a token for a request sent outside the writer
+        asyncio.run_coroutine_threadsafe(self.bucket.acquire(), self.loop).result()
+
+    def pause(self, seconds):
+        # Hold every request sharing the bucket, e.g. after a 429 on a read
+        self.loop.call_soon_threadsafe(self.bucket.pause, seconds)
+
+    def submit(self, method, on_success=None, on_error=None, **kwargs):
+        self.pending.acquire()
+        future = asyncio.run_coroutine_threadsafe(self._send(method, kwargs), self.loop)
+        with self.futures_lock:
+            self.futures.add(future)
+
+        def done(future):
+            try:
+                error = future.exception()
+                if error is None:
+                    if on_success:
+                        on_success(future.result())
+                elif on_error:
+                    on_error(error)
+                else:
+                    self.errors.append(error)
+            finally:
+                self.pending.release()
+                with self.futures_lock:
+                    self.futures.discard(future)
+
+        future.add_done_callback(done)
+        return future
+
+    async def _send(self, method, kwargs):
+        endpoint = self.client
+        for name in method.split("."):
+            endpoint = getattr(endpoint, name)
+
+        # The same request content is the same operation, e.g. when a run is restarted
+        op_id = payload_hash([method, kwargs])
+        if self.journal:
+            if self.run_id is None:
+                self.run_id = self.journal.begin_run()
+            page_id = self.journal.finished_write(self.run_id, op_id)
+            if page_id:
+                return {"object": "page", "id": page_id}
+
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            async with self.in_flight:
+                try:
+                    with self.metrics.call(f"notion.{method}", retry=attempt > 0):
+                        result = await endpoint(**kwargs)
+                    break
+                except Exception as error:
+                    # A create that may have gone through is not sent twice
+                    if attempt >= self.max_retries or not is_retryable(error, idempotent=method != "pages.create"):
+                        raise
+                    if isinstance(error, HTTPResponseError) and error.status == 429:
+                        self.bucket.pause(retry_after_seconds(error))
+                        delay = 0
+                    else:
+                        delay = backoff_delay(attempt)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if self.journal:
+            self.journal.record_write(self.run_id, op_id, method, result["id"])
+        return result
+
+    def flush(self):
+        # Wait for every write submitted so far
+        while True:
+            with self.futures_lock:
+                futures = list(self.futures)
+            if not futures:
+                return
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    pass
+
+    def finish_run(self):
+        # Wait for the run's writes and clear its journal; the next write starts a new run
+        self.flush()
+        if self.journal and self.run_id is not None:
+            self.journal.end_run(self.run_id)
+            self.run_id = None
+
+    def close(self, raise_errors=True):
+        try:
+            self.flush()
+        finally:
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+        if raise_errors and self.errors:
+            raise self.errors[0]
@@ -1,8 +1,27 @@
 from datetime import date, datetime
-from garminconnect import Garmin
+from analytics_store import AnalyticsStore
+from best_efforts import best_effort_records
+from garmin_session import get_garmin
 from notion_client import Client
+from notion_client.helpers import iterate_paginated_api
+from notion_schema import check_schema
+from notion_writer import NotionWriter
+from resilience import resilient_notion
+from sync_plan import SyncPlan, dry_run
+from sync_state import SyncLedger
 import os
 
+# Properties written by this sync and their Notion types
+NOTION_SCHEMA = {
+    "Record": "title",
+    "Date": "date",
+    "Activity Type": "select",
+    "typeId": "number",
+    "PR": "checkbox",
+    "Value": "rich_text",
+    "Pace": "rich_text",
+}
+
 def get_icon_for_record(activity_name):
     icon_map = {
         "1K": "🥇",
@@ -156,31 +175,37 @@ def replace_activity_name_by_typeId(typeId):
     }
     return typeId_name_map.get(typeId, "Unnamed Activity")
 
-def get_existing_record(client, database_id, activity_name):
-    query = client.databases.query(
-        database_id=database_id,
-        filter={
-            "and": [
-                {"property": "Record", "title": {"equals": activity_name}},
-                {"property": "PR", "checkbox": {"equals": True}}
-            ]
-        }
-    )
-    return query['results'][0] if query['results'] else None
-
-def get_record_by_date_and_name(client, database_id, activity_date, activity_name):
-    query = client.databases.query(
-        database_id=database_id,
-        filter={
-            "and": [
-                {"property": "Record", "title": {"equals": activity_name}},
-                {"property": "Date", "date": {"equals": activity_date}}
-            ]
-        }
+def plain_text(prop):
+    items = (prop or {}).get('title') or (prop or {}).get('rich_text') or []
+    return "".join(item.get('plain_text') or item.get('text', {}).get('content', "") for item in items)
+
+def page_date(page):
+    date_prop = page['properties'].get('Date') or {}
+    start = (date_prop.get('date') or {}).get('start')
+    return start[:10] if start else None
+
+def build_record_index(client, database_id):
+    # One paginated read of the PR database:
+    # current PR page by record name, and any page by (record name, date)
+    current_prs = {}
+    by_date = {}
+    for page in iterate_paginated_api(client.databases.query, database_id=database_id):
+        name = plain_text(page['properties'].get('Record'))
+        if page['properties'].get('PR', {}).get('checkbox'):
+            current_prs.setdefault(name, page)
+        by_date.setdefault((name, page_date(page)), page)
+    return current_prs, by_date
+
+def record_is_current(page, value, pace):
+    # Nothing to write if the page is already the PR with the same value and pace
+    properties = page['properties']
+    return (
+        properties.get('PR', {}).get('checkbox') is True
+        and (not value or plain_text(properties.get('Value')) == value)
+        and (not pace or plain_text(properties.get('Pace')) == pace)
     )
-    return query['results'][0] if query['results'] else None
 
-def update_record(client, page_id, activity_date, value, pace, activity_name, is_pr=True):
+def update_record(writer, page_id, activity_date, value, pace, activity_name, is_pr=True, replaces=None):
     properties = {
         "Date": {"date": {"start": activity_date}},
         "PR": {"checkbox": is_pr}
@@ -195,18 +220,19 @@ def update_record(client, page_id, activity_date, value, pace, activity_name, is
     icon = get_icon_for_record(activity_name)
     cover = get_cover_for_record(activity_name)
 
-    try:
-        client.pages.update(
-            page_id=page_id,
-            properties=properties,
-            icon={"emoji": icon},
-            cover={"type": "external", "external": {"url": cover}}
-        )
-        
-    except Exception as e:
-        print(f"Error updating record: {e}")
-
-def write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace):
+    request = dict(
+        page_id=page_id,
+        properties=properties,
+        icon={"emoji": icon},
+        cover={"type": "external", "external": {"url": cover}},
+        on_error=lambda e: print(f"Error updating record: {e}")
+    )
+    # Clearing the PR flag retires the page, which the plan applies before new records
+    if is_pr:
+        return writer.update(replaces=replaces, **request)
+    return writer.archive(**request)
+
+def write_new_record(writer, database_id, activity_date, activity_type, activity_name, typeId, value, pace, replaces=None):
     properties = {
         "Date": {"date": {"start": activity_date}},
         "Activity Type": {"select": {"name": activity_type}},
@@ -224,70 +250,124 @@ def write_new_record(client, database_id, activity_date, activity_type, activity
     icon = get_icon_for_record(activity_name)
     cover = get_cover_for_record(activity_name)
 
-    try:
-        client.pages.create(
-            parent={"database_id": database_id},
-            properties=properties,
-            icon={"emoji": icon},
-            cover={"type": "external", "external": {"url": cover}}
-        )
-    except Exception as e:
-        print(f"Error writing new record: {e}")
+    return writer.create(
+        parent={"database_id": database_id},
+        properties=properties,
+        icon={"emoji": icon},
+        cover={"type": "external", "external": {"url": cover}},
+        replaces=replaces,
+        on_error=lambda e: print(f"Error writing new record: {e}")
+    )
 
-def main():
-    garmin_email = os.getenv("GARMIN_EMAIL")
-    garmin_password = os.getenv("GARMIN_PASSWORD")
-    notion_token = os.getenv("NOTION_TOKEN")
-    database_id = os.getenv("NOTION_PR_DB_ID")
+def plan_record(plan, current_prs, by_date, database_id, activity_date, activity_type, activity_name, typeId, value, pace):
+    # Decide between no-op, update, archive + create and create for one record
+    existing_pr_record = current_prs.get(activity_name)
+    existing_date_record = by_date.get((activity_name, activity_date[:10] if activity_date else None))
+
+    if existing_date_record and record_is_current(existing_date_record, value, pace):
+        plan.noop(f"{activity_type} - {activity_name}")
+        print(f"No update needed: {activity_type} - {activity_name}")
+    elif existing_date_record:
+        update_record(plan, existing_date_record['id'], activity_date, value, pace, activity_name, True)
+        print(f"Updating existing record: {activity_type} - {activity_name}")
+    elif existing_pr_record:
+        # Add error handling here
+        try:
+            date_prop = existing_pr_record['properties']['Date']
+            if date_prop and date_prop.get('date') and date_prop['date'].get('start'):
+                existing_date = date_prop['date']['start']
+            
+                if activity_date > existing_date:
+                    archived = update_record(plan, existing_pr_record['id'], existing_date, None, None, activity_name, False)
+                    print(f"Archiving old record: {activity_type} - {activity_name}")
+                
+                    write_new_record(plan, database_id, activity_date, activity_type, activity_name, typeId, value, pace, replaces=archived)
+                    print(f"Creating new PR record: {activity_type} - {activity_name}")
+                else:
+                    plan.noop(f"{activity_type} - {activity_name}")
+                    print(f"No update needed: {activity_type} - {activity_name}")
+            else:
+                # Handle case where date is missing or improperly formatted
+                print(f"Warning: Record {activity_name} has invalid date format - updating anyway")
+                update_record(plan, existing_pr_record['id'], activity_date, value, pace, activity_name, True)
+        except (KeyError, TypeError) as e:
+            print(f"Error processing record {activity_name}: {e}")
+            print(f"Record data: {existing_pr_record['properties']}")
+            # Fallback - create new record if we can't process the existing one properly
+            write_new_record(plan, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
+    else:
+        write_new_record(plan, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
+        print(f"Writing new record: {activity_type} - {activity_name}")
 
-    garmin = Garmin(garmin_email, garmin_password)
-    garmin.login()
+def plan_best_effort(plan, current_prs, by_date, database_id, effort):
+    # Best efforts are decided by value, not date: an older activity archived late can hold the best
+    name, activity_date, activity_type = effort["name"], effort["date"], effort["activity_type"]
+    value, pace = effort["value"], effort["pace"]
+    existing_pr_record = current_prs.get(name)
+    existing_date_record = by_date.get((name, activity_date))
 
-    client = Client(auth=notion_token)
+    if existing_pr_record and record_is_current(existing_pr_record, value, pace) and page_date(existing_pr_record) == activity_date:
+        plan.noop(f"{activity_type} - {name}")
+        print(f"No update needed: {activity_type} - {name}")
+        return
+    archived = None
+    if existing_pr_record and existing_pr_record is not existing_date_record:
+        archived = update_record(plan, existing_pr_record['id'], page_date(existing_pr_record), None, None, name, False)
+        print(f"Archiving old record: {activity_type} - {name}")
+    if existing_date_record:
+        update_record(plan, existing_date_record['id'], activity_date, value, pace, name, True, replaces=archived)
+        print(f"Updating existing record: {activity_type} - {name}")
+    else:
+        write_new_record(plan, database_id, activity_date, activity_type, name, None, value, pace, replaces=archived)
+        print(f"Creating new PR record: {activity_type} - {name}")
 
+def run_sync(garmin, client, writer, ledger, database_id, store=None):
+    check_schema(client, database_id, NOTION_SCHEMA, "Personal records database")
     records = garmin.get_personal_record()
     filtered_records = [record for record in records if record.get('typeId') != 16]
+    current_prs, by_date = build_record_index(client, database_id)
 
+    # Plan every record first; applying archives before creates keeps one current PR per record
+    plan = SyncPlan("Personal records")
+    rows = []
     for record in filtered_records:
         activity_date = record.get('prStartTimeGmtFormatted')
         activity_type = format_activity_type(record.get('activityType'))
         activity_name = replace_activity_name_by_typeId(record.get('typeId'))
         typeId = record.get('typeId', 0)
         value, pace = format_garmin_value(record.get('value', 0), activity_type, typeId)
+        if activity_date:
+            rows.append({"record": activity_name, "date": activity_date[:10], "activity_type": activity_type, "value": value, "pace": pace})
 
-        existing_pr_record = get_existing_record(client, database_id, activity_name)
-        existing_date_record = get_record_by_date_and_name(client, database_id, activity_date, activity_name)
-
-        if existing_date_record:
-            update_record(client, existing_date_record['id'], activity_date, value, pace, activity_name, True)
-            print(f"Updated existing record: {activity_type} - {activity_name}")
-        elif existing_pr_record:
-            # Add error handling here
-            try:
-                date_prop = existing_pr_record['properties']['Date']
-                if date_prop and date_prop.get('date') and date_prop['date'].get('start'):
-                    existing_date = date_prop['date']['start']
-                    
-                    if activity_date > existing_date:
-                        update_record(client, existing_pr_record['id'], existing_date, None, None, activity_name, False)
-                        print(f"Archived old record: {activity_type} - {activity_name}")
-                        
-                        write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
-                        print(f"Created new PR record: {activity_type} - {activity_name}")
-                    else:
-                        print(f"No update needed: {activity_type} - {activity_name}")
-                else:
-                    # Handle case where date is missing or improperly formatted
-                    print(f"Warning: Record {activity_name} has invalid date format - updating anyway")
-                    update_record(client, existing_pr_record['id'], activity_date, value, pace, activity_name, True)
-            except (KeyError, TypeError) as e:
-                print(f"Error processing record {activity_name}: {e}")
-                print(f"Record data: {existing_pr_record['properties']}")
-                # Fallback - create new record if we can't process the existing one properly
-                write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
-        else:
-            write_new_record(client, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
-            print(f"Successfully written new record: {activity_type} - {activity_name}")
+        plan_record(plan, current_prs, by_date, database_id, activity_date, activity_type, activity_name, typeId, value, pace)
+
+    # Best efforts over any distance or duration, from the archived activity streams
+    for effort in best_effort_records(garmin, store):
+        rows.append({"record": effort["name"], "date": effort["date"], "activity_type": effort["activity_type"],
+                     "value": effort["value"], "pace": effort["pace"]})
+        plan_best_effort(plan, current_prs, by_date, database_id, effort)
+
+    if store and rows:
+        store.add("personal_records", rows)
+
+    if dry_run():
+        plan.report()
+    else:
+        plan.apply(writer)
+    return plan.writes()
+
+def main():
+    garmin_email = os.getenv("GARMIN_EMAIL")
+    garmin_password = os.getenv("GARMIN_PASSWORD")
+    notion_token = os.getenv("NOTION_TOKEN")
+    database_id = os.getenv("NOTION_PR_DB_ID")
+
+    garmin = get_garmin(garmin_email, garmin_password)
+
+    # The ledger holds the write journal, so a rerun does not repeat finished writes
+    with SyncLedger() as ledger, AnalyticsStore() as store, NotionWriter(auth=notion_token, journal=ledger) as writer:
+        client = resilient_notion(Client(auth=notion_token), limiter=writer)
+        run_sync(garmin, client, writer, ledger, database_id, store)
 
 if __name__ == '__main__':
     main()
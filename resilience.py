@@ -0,0 +1,154 @@
+"""
+Retries for Garmin and Notion calls.
+
+Errors are classified as retryable (429, 5xx, conflicts, timeouts, dropped
+connections) or fatal (bad requests, authentication, missing objects).
+Retryable calls are repeated with full-jitter exponential backoff, or after
+the Retry-After interval of a 429. The Garmin client is wrapped by
+RetryingGarmin and the synchronous Notion client by resilient_notion();
+NotionWriter applies the same classification to its writes. Given the
+writer as `limiter`, the Notion reads take their tokens from the writer's
+bucket and a 429 on a read pauses the writes too, so reads and writes share
+one rate limit. Page creates are not idempotent: after a timeout, a dropped
+connection or a gateway error Notion may already have made the page, so a
+create is only sent again when it surely never reached Notion (connection
+failures, 409, 429 and 503). Other failures are left to the next run, which
+looks the page up by its key before creating it. Which writes of the current run already finished is kept in the
+ledger's write journal (see SyncLedger), so a run restarted after a crash
+does not send them again.
+"""
+import random
+import time
+
+import httpx
+import requests
+from garminconnect import GarminConnectConnectionError, GarminConnectTooManyRequestsError
+from notion_client.errors import RequestTimeoutError
+
+from api_metrics import METRICS
+
+MAX_ATTEMPTS = 5
+BASE_DELAY_SECONDS = 0.5
+MAX_DELAY_SECONDS = 30.0
+
+RETRYABLE_STATUSES = {409, 429, 500, 502, 503, 504}
+# Statuses Notion answers with before making any change
+UNPROCESSED_STATUSES = {409, 429, 503}
+# The request never reached the server
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, requests.ConnectTimeout)
+
+
+def backoff_delay(attempt, base=BASE_DELAY_SECONDS, cap=MAX_DELAY_SECONDS):
+    # Full jitter: anywhere between 0 and the exponential ceiling for this attempt
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def error_chain(error):
+    # The error and the errors it was raised from
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def error_status(error):
+    # HTTP status of an error or of the errors it wraps, None for non-HTTP errors
+    for error in error_chain(error):
+        status = getattr(error, "status", None)
+        if isinstance(status, int):
+            return status
+        for holder in (error, getattr(error, "error", None)):
+            response = getattr(holder, "response", None)
+            if getattr(response, "status_code", None) is not None:
+                return response.status_code
+    return None
+
+
+def retry_after_seconds(error, default=1.0):
+    # The Retry-After header of the response behind an error
+    for cause in error_chain(error):
+        for holder in (cause, getattr(cause, "response", None), getattr(getattr(cause, "error", None), "response", None)):
+            headers = getattr(holder, "headers", None)
+            value = headers.get("retry-after") if hasattr(headers, "get") else None
+            if value is not None:
+                try:
+                    return float(value)
+                except (TypeError, ValueError):
+                    return default
+    return default
+
+
+def is_retryable(error, idempotent=True):
+    # A call that is not idempotent (a page create) is only retried if it surely was not processed
+    status = error_status(error)
+    if not idempotent:
+        if status is not None:
+            return status in UNPROCESSED_STATUSES
+        return any(isinstance(cause, UNSENT_ERRORS) for cause in error_chain(error))
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return isinstance(error, (
+        GarminConnectTooManyRequestsError,
+        GarminConnectConnectionError,
+        RequestTimeoutError,
+        httpx.TransportError,
+        requests.ConnectionError,
+        requests.Timeout,
+    ))
+
+
+def retry_call(function, *args, name=None, attempts=MAX_ATTEMPTS, limiter=None, **kwargs):
+    # Call `function`, retrying retryable errors with backoff; fatal errors are raised at once.
+    # A limiter (NotionWriter) hands out a token before every attempt and is paused by 429s.
+    for attempt in range(attempts):
+        if limiter:
+            limiter.throttle()
+        try:
+            return function(*args, **kwargs)
+        except Exception as error:
+            if attempt + 1 >= attempts or not is_retryable(error):
+                raise
+            if error_status(error) == 429:
+                delay = retry_after_seconds(error, default=backoff_delay(attempt))
+                if limiter:
+                    limiter.pause(delay)
+            else:
+                delay = backoff_delay(attempt)
+            if name:
+                METRICS.count_retry(name)
+            print(f"⚠️ {name or getattr(function, '__name__', 'call')} failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class RetryingGarmin:
+    """Garmin client proxy that retries the data getters on transient errors."""
+
+    def __init__(self, garmin, attempts=MAX_ATTEMPTS):
+        self.wrapped = garmin
+        self.attempts = attempts
+
+    def __getattr__(self, name):
+        method = getattr(self.wrapped, name)
+        if not name.startswith(("get_", "download_")) or not callable(method):
+            return method
+
+        def retrying(*args, **kwargs):
+            return retry_call(method, *args, name=f"garmin.{name}", attempts=self.attempts, **kwargs)
+
+        return retrying
+
+
+def resilient_notion(client, attempts=MAX_ATTEMPTS, limiter=None):
+    # Retry the read endpoints of the synchronous Notion client; writes go through NotionWriter.
+    # Pass the writer as `limiter` so the reads count against the same rate limit.
+    for endpoint, method in (("databases", "query"), ("databases", "retrieve")):
+        target = getattr(client, endpoint)
+        call = getattr(target, method)
+        name = f"notion.{endpoint}.{method}"
+
+        def retrying(*args, call=call, name=name, **kwargs):
+            return retry_call(call, *args, name=name, attempts=attempts, limiter=limiter, **kwargs)
+
+        setattr(target, method, retrying)
+    return client
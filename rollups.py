@@ -0,0 +1,188 @@
+"""
+Weekly and monthly training summaries in Notion, maintained incrementally.
+
+The syncs write every activity, steps day and night of sleep to the analytics
+store (see analytics_store.py), which remembers the days it touched. This
+module recomputes only the ISO weeks and calendar months that contain those
+days, from the store's rows for that period, and upserts one summary page
+per period to the NOTION_ROLLUP_DB_ID database: distance, duration,
+calories, the mix of main activity types with their average training
+effect, average sleep and resting HR, and steps. Unchanged summaries are
+skipped through the ledger (kind "rollup"); the touched days are cleared
+once every write succeeded, so the full history is never rescanned.
+
+Usage: python rollups.py
+"""
+import os
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+from notion_client import Client
+
+from analytics_store import AnalyticsStore
+from notion_schema import check_schema
+from notion_writer import NotionWriter
+from resilience import resilient_notion
+from sync_plan import SyncPlan, dry_run
+from sync_state import SyncLedger, payload_hash
+
+PERIOD_ICONS = {"Week": "📅", "Month": "🗓️"}
+
+# Properties written by the rollups and their Notion types
+NOTION_SCHEMA = {
+    "Period": "title",
+    "Type": "select",
+    "Dates": "date",
+    "Activities": "number",
+    "Distance (km)": "number",
+    "Duration (h)": "number",
+    "Calories": "number",
+    "Type Mix": "rich_text",
+    "Avg Sleep (h)": "number",
+    "Avg Resting HR": "number",
+    "Avg Steps": "number",
+    "Total Steps": "number",
+}
+
+
+def period_of(kind, day):
+    # (label, first day, last day) of the week or month containing day
+    if kind == "Week":
+        start = day - timedelta(days=day.weekday())
+        iso_year, iso_week, _ = day.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}", start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start.strftime("%Y-%m"), start, next_month - timedelta(days=1)
+
+
+def affected_periods(days):
+    periods = set()
+    for day in days:
+        for kind in ("Week", "Month"):
+            periods.add((kind,) + period_of(kind, date.fromisoformat(day)))
+    return sorted(periods, key=lambda period: (period[2], period[0]))
+
+
+def period_summary(store, start, end):
+    # Aggregates of one period, read from the store's rows for those days only
+    bounds = (start.isoformat(), end.isoformat())
+    by_type = store.query(
+        """
+        SELECT activity_type, COUNT(*), SUM(distance_km), SUM(duration_min), SUM(calories),
+               AVG(aerobic_effect), AVG(anaerobic_effect)
+        FROM activities WHERE date BETWEEN ? AND ?
+        GROUP BY activity_type ORDER BY SUM(duration_min) DESC
+        """,
+        bounds,
+    )
+    avg_sleep, avg_rhr = store.query(
+        "SELECT AVG(total_sleep_h), AVG(resting_hr) FROM sleep WHERE date BETWEEN ? AND ?", bounds
+    )[0]
+    avg_steps, total_steps = store.query(
+        "SELECT AVG(steps), SUM(steps) FROM daily_steps WHERE date BETWEEN ? AND ?", bounds
+    )[0]
+    return {
+        "activities": sum(row[1] for row in by_type),
+        "distance_km": sum(row[2] or 0 for row in by_type),
+        "duration_min": sum(row[3] or 0 for row in by_type),
+        "calories": sum(row[4] or 0 for row in by_type),
+        "types": by_type,
+        "avg_sleep_h": avg_sleep,
+        "avg_rhr": avg_rhr,
+        "avg_steps": avg_steps,
+        "total_steps": total_steps,
+    }
+
+
+def format_type_mix(types):
+    # e.g. "Running 4× 3.2 h (TE 3.1/0.4), Strength 2× 1.5 h (TE 2.0/1.1)"
+    return ", ".join(
+        f"{activity_type} {count}× {(duration or 0) / 60:.1f} h (TE {aerobic or 0:.1f}/{anaerobic or 0:.1f})"
+        for activity_type, count, _, duration, _, aerobic, anaerobic in types
+    )
+
+
+def rollup_properties(kind, label, start, end, summary):
+    rounded = lambda value, digits=1: round(value, digits) if value is not None else None
+    return {
+        "Period": {"title": [{"text": {"content": label}}]},
+        "Type": {"select": {"name": kind}},
+        "Dates": {"date": {"start": start.isoformat(), "end": end.isoformat()}},
+        "Activities": {"number": summary["activities"]},
+        "Distance (km)": {"number": round(summary["distance_km"], 2)},
+        "Duration (h)": {"number": round(summary["duration_min"] / 60, 2)},
+        "Calories": {"number": round(summary["calories"])},
+        "Type Mix": {"rich_text": [{"text": {"content": format_type_mix(summary["types"])}}]},
+        "Avg Sleep (h)": {"number": rounded(summary["avg_sleep_h"], 2)},
+        "Avg Resting HR": {"number": rounded(summary["avg_rhr"])},
+        "Avg Steps": {"number": rounded(summary["avg_steps"], 0)},
+        "Total Steps": {"number": summary["total_steps"]},
+    }
+
+
+def find_rollup_page(client, database_id, kind, label):
+    # Only periods the ledger does not know yet are looked up in Notion
+    results = client.databases.query(
+        database_id=database_id,
+        filter={"and": [
+            {"property": "Period", "title": {"equals": label}},
+            {"property": "Type", "select": {"equals": kind}},
+        ]},
+    ).get('results', [])
+    return results[0] if results else None
+
+
+def run_rollups(client, writer, ledger, database_id, store):
+    days = store.touched_days()
+    if not days:
+        return 0
+    check_schema(client, database_id, NOTION_SCHEMA, "Rollup database")
+
+    plan = SyncPlan("Rollups")
+    for kind, label, start, end in affected_periods(days):
+        properties = rollup_properties(kind, label, start, end, period_summary(store, start, end))
+        key = f"{kind.lower()}:{label}"
+        digest = payload_hash(properties)
+
+        def record_page(page, key=key, digest=digest):
+            ledger.record("rollup", key, page['id'], digest)
+
+        synced = ledger.get("rollup", key)
+        page = {'id': synced[0]} if synced else find_rollup_page(client, database_id, kind, label)
+        if synced and synced[1] == digest:
+            plan.noop(label)
+        elif page:
+            plan.update(page_id=page['id'], properties=properties, on_success=record_page)
+        else:
+            plan.create(
+                parent={"database_id": database_id},
+                properties=properties,
+                icon={"emoji": PERIOD_ICONS[kind]},
+                on_success=record_page,
+            )
+
+    if dry_run():
+        plan.report()
+        return plan.writes()
+
+    # The touched days stay pending until every summary for them was written
+    plan.apply(writer)
+    if plan.wait():
+        store.clear_touched(days)
+    print(f"📊 Rollups: {plan.writes()} of {sum(plan.counts().values())} period(s) updated")
+    return plan.writes()
+
+
+def main():
+    load_dotenv()
+    notion_token = os.getenv("NOTION_TOKEN")
+    database_id = os.getenv("NOTION_ROLLUP_DB_ID")
+
+    with SyncLedger() as ledger, AnalyticsStore() as store, NotionWriter(auth=notion_token, journal=ledger) as writer:
+        client = resilient_notion(Client(auth=notion_token), limiter=writer)
+        run_rollups(client, writer, ledger, database_id, store)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,16 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from garminconnect import Garmin
+from analytics_store import AnalyticsStore
+from garmin_session import get_garmin
 from notion_client import Client
+from notion_client.helpers import iterate_paginated_api
 from dotenv import load_dotenv
+from notion_schema import check_schema
+from notion_writer import NotionWriter
+from resilience import resilient_notion
+from sync_plan import SyncPlan, dry_run
+from sync_state import SyncLedger, payload_hash
 import pytz
 import os
 
@@ -11,6 +20,47 @@ load_dotenv()
 # Timezone setup
 local_tz = pytz.timezone("Europe/Berlin")
 
+# Garmin requests in flight at once while fetching sleep and health data
+SLEEP_FETCH_WORKERS = 6
+# Days fetched ahead of the one being written during a backfill
+SLEEP_DAYS_AHEAD = 4
+# Planned days applied together, so writes overlap with the remaining fetches
+SLEEP_APPLY_BATCH = 30
+
+# Properties written by this sync and their Notion types
+NOTION_SCHEMA = {
+    "Date": "title",
+    "Times": "rich_text",
+    "Long Date": "date",
+    "Full Date/Time": "date",
+    "Total Sleep (h)": "number",
+    "Light Sleep (h)": "number",
+    "Deep Sleep (h)": "number",
+    "REM Sleep (h)": "number",
+    "Awake Time (h)": "number",
+    "Total Sleep": "rich_text",
+    "Light Sleep": "rich_text",
+    "Deep Sleep": "rich_text",
+    "REM Sleep": "rich_text",
+    "Awake Time": "rich_text",
+    "Resting HR": "number",
+    "Sleep Score": "number",
+    "HRV (ms)": "number",
+    "HRV Label": "select",
+    "Night Stress": "number",
+    "Yesterdays Stress": "number",
+    "Total Calories": "number",
+    "Consumed Calories": "number",
+    "Active Calories": "number",
+    "Calorie Balance": "number",
+    "Calorie Deficit %": "number",
+    "Moderate Intensity Min": "number",
+    "Vigorous Intensity Min": "number",
+    "Hydration (ml)": "number",
+    "Weight (kg)": "number",
+    "7-Day Avg Resting HR": "number",
+}
+
 # Helper functions
 def format_duration(seconds):
     minutes = (seconds or 0) // 60
@@ -33,7 +83,35 @@ def sleep_data_exists(client, database_id, sleep_date):
     results = query.get('results', [])
     return results[0] if results else None
 
-def create_sleep_entry(client, database_id, sleep_data, yesterday_stress=None, summary=None, hydration_ml=None, weight_kg=None, avg_rhr_7d=None):
+def sleep_pages_in_range(client, database_id, start_date, end_date):
+    # One paginated query for a whole backfill instead of one lookup per day
+    pages = iterate_paginated_api(
+        client.databases.query,
+        database_id=database_id,
+        filter={
+            "and": [
+                {"property": "Long Date", "date": {"on_or_after": start_date}},
+                {"property": "Long Date", "date": {"on_or_before": end_date}}
+            ]
+        }
+    )
+    existing = {}
+    for page in pages:
+        start = (page['properties']['Long Date'].get('date') or {}).get('start')
+        if start:
+            existing.setdefault(start[:10], page)
+    return existing
+
+def get_weights(garmin, start_date, end_date):
+    # Weigh-ins for the whole range in one request: {calendar date: kg}
+    body_data = garmin.get_body_composition(start_date, end_date)
+    weights = {}
+    for entry in (body_data or {}).get("dateWeightList", []):
+        if entry.get("calendarDate") and entry.get("weight"):
+            weights.setdefault(entry["calendarDate"], entry["weight"] / 1000)
+    return weights
+
+def upsert_sleep_entry(client, plan, database_id, sleep_data, yesterday_stress=None, summary=None, hydration_ml=None, weight_kg=None, avg_rhr_7d=None, ledger=None, existing_pages=None):
     daily = sleep_data.get('dailySleepDTO', {})
 
     if not daily or not daily.get('sleepStartTimestampGMT'):
@@ -93,56 +171,184 @@ def create_sleep_entry(client, database_id, sleep_data, yesterday_stress=None, s
         "7-Day Avg Resting HR": {"number": avg_rhr_7d},
     }
 
-    print(f"📤 Creating Notion entry for {sleep_date} with data...")
-    try:
-        client.pages.create(
-            parent={"database_id": database_id},
+    digest = payload_hash(properties)
+    synced = ledger.get("sleep", sleep_date) if ledger else None
+
+    def record_page(page):
+        if ledger:
+            ledger.record("sleep", sleep_date, page['id'], digest)
+
+    if synced:
+        page_id, synced_digest = synced
+        if synced_digest == digest:
+            print(f"ℹ️ Notion entry for {sleep_date} is up to date")
+            plan.noop(sleep_date)
+            return False
+    else:
+        if existing_pages is not None:
+            existing = existing_pages.get(sleep_date)
+        else:
+            existing = sleep_data_exists(client, database_id, sleep_date)
+        page_id = existing['id'] if existing else None
+
+    if page_id:
+        print(f"📤 Planning update of Notion entry for {sleep_date}...")
+        plan.update(
+            page_id=page_id,
             properties=properties,
-            icon={"emoji": "😴"}
+            on_success=lambda page: (record_page(page), print(f"✅ Notion entry updated for {sleep_date}")),
+            on_error=lambda e: print(f"❌ Error updating entry for {sleep_date}: {e}")
         )
-        print(f"✅ Notion entry created for {sleep_date}")
-    except Exception as e:
-        print(f"❌ Error creating entry for {sleep_date}: {e}")
+        return True
 
-def main():
-    garmin = Garmin(os.getenv("GARMIN_EMAIL"), os.getenv("GARMIN_PASSWORD"))
-    garmin.login()
-    client = Client(auth=os.getenv("NOTION_TOKEN"))
-    database_id = os.getenv("NOTION_SLEEP_DB_ID")
+    print(f"📤 Planning Notion entry for {sleep_date}...")
+    plan.create(
+        parent={"database_id": database_id},
+        properties=properties,
+        icon={"emoji": "😴"},
+        on_success=lambda page: (record_page(page), print(f"✅ Notion entry created for {sleep_date}")),
+        on_error=lambda e: print(f"❌ Error creating entry for {sleep_date}: {e}")
+    )
+    return True
 
-    date = datetime.today() - timedelta(days=1)
+def fetch_day(pool, garmin, date):
+    # The per-day Garmin calls are independent, so they run concurrently
     date_str = date.strftime("%Y-%m-%d")
-    yesterday = date - timedelta(days=1)
+    yesterday_str = (date - timedelta(days=1)).strftime("%Y-%m-%d")
+    return {
+        "sleep": pool.submit(garmin.get_sleep_data, date_str),
+        "stress": pool.submit(garmin.get_stress_data, yesterday_str),
+        "summary": pool.submit(garmin.get_user_summary, date_str),
+        "hydration": pool.submit(garmin.get_hydration_data, date_str),
+    }
 
+def sleep_row(sleep_data, summary, hydration_ml, weight_kg):
+    # The analytics store row for a night; rolling averages are computed from these
+    daily = sleep_data.get('dailySleepDTO', {})
+    summary = summary or {}
+    total_kcal = summary.get('totalKilocalories')
+    consumed_kcal = summary.get('consumedKilocalories')
+    hours = lambda key: round((daily.get(key) or 0) / 3600, 2)
+    return {
+        "date": daily.get('calendarDate'),
+        "total_sleep_h": round(hours('deepSleepSeconds') + hours('lightSleepSeconds') + hours('remSleepSeconds'), 2),
+        "deep_sleep_h": hours('deepSleepSeconds'),
+        "light_sleep_h": hours('lightSleepSeconds'),
+        "rem_sleep_h": hours('remSleepSeconds'),
+        "awake_h": hours('awakeSleepSeconds'),
+        "sleep_score": daily.get('sleepScores', {}).get('overall', {}).get('value'),
+        "resting_hr": sleep_data.get('restingHeartRate'),
+        "hrv_ms": sleep_data.get('avgOvernightHrv'),
+        "night_stress": daily.get('avgSleepStress'),
+        "total_kcal": total_kcal,
+        "consumed_kcal": consumed_kcal,
+        "active_kcal": summary.get('activeKilocalories'),
+        "calorie_balance": consumed_kcal - total_kcal if total_kcal is not None and consumed_kcal is not None else None,
+        "hydration_ml": hydration_ml,
+        "weight_kg": weight_kg or None,
+    }
+
+def sync_day(client, plan, ledger, database_id, date, calls, weights, existing_pages=None, store=None):
+    date_str = date.strftime("%Y-%m-%d")
     try:
-        sleep_data = garmin.get_sleep_data(date_str)
+        sleep_data = calls["sleep"].result()
         if not (isinstance(sleep_data, dict) and "dailySleepDTO" in sleep_data):
             print(f"⚠️ No valid sleep data on {date_str}")
             return
 
-        stress_data = garmin.get_stress_data(yesterday.strftime("%Y-%m-%d"))
+        stress_data = calls["stress"].result()
         yesterday_stress = stress_data.get("avgStressLevel", 0)
 
-        summary = garmin.get_user_summary(date_str)
-        hydration = garmin.get_hydration_data(date_str)
+        summary = calls["summary"].result()
+        hydration = calls["hydration"].result()
         hydration_ml = hydration.get("valueInML") if hydration else 0
 
-        heart_data = garmin.get_heart_rates(date_str)
-        avg_rhr_7d = heart_data.get("lastSevenDaysAvgRestingHeartRate") if heart_data else 0
-
-        body_data = garmin.get_body_composition(date_str, date_str)
-        weight_kg = body_data[0].get("weight") / 1000 if isinstance(body_data, list) and body_data else 0
+        weight_kg = weights.result().get(date_str, 0)
 
         sleep_date = sleep_data.get("dailySleepDTO", {}).get("calendarDate")
         print(f"📅 Processing sleep entry for {sleep_date}")
 
+        # The 7-day resting HR is averaged over the stored nights, this one included; until the
+        # store holds enough of them (first run, lost state) Garmin's own average is used
+        avg_rhr_7d = None
+        if store and sleep_date:
+            store.add("sleep", [sleep_row(sleep_data, summary, hydration_ml, weight_kg)])
+            avg_rhr_7d = store.resting_hr_avg(sleep_date)
+        if avg_rhr_7d is None:
+            avg_rhr_7d = (summary or {}).get('lastSevenDaysAvgRestingHeartRate')
+
         if sleep_date:
-            create_sleep_entry(client, database_id, sleep_data, yesterday_stress, summary, hydration_ml, weight_kg, avg_rhr_7d)
+            return upsert_sleep_entry(client, plan, database_id, sleep_data, yesterday_stress, summary, hydration_ml, weight_kg, avg_rhr_7d, ledger, existing_pages)
         else:
             print(f"ℹ️ Entry already exists or missing sleep_date: {sleep_date}")
 
     except Exception as e:
         print(f"⚠️ Failed on {date_str}: {e}")
 
+def sleep_dates():
+    """
+    Dates to sync: GARMIN_SLEEP_START to GARMIN_SLEEP_END (YYYY-MM-DD, inclusive),
+    yesterday by default.
+    """
+    yesterday = datetime.today() - timedelta(days=1)
+    start = os.getenv("GARMIN_SLEEP_START")
+    end = os.getenv("GARMIN_SLEEP_END")
+    start = datetime.strptime(start, "%Y-%m-%d") if start else yesterday
+    end = datetime.strptime(end, "%Y-%m-%d") if end else max(start, yesterday)
+    return [start + timedelta(days=x) for x in range((end.date() - start.date()).days + 1)]
+
+def run_sync(garmin, client, writer, ledger, database_id, store=None):
+    check_schema(client, database_id, NOTION_SCHEMA, "Sleep database")
+
+    plan = SyncPlan("Sleep")
+    dry = dry_run()
+
+    # Days already in the ledger were synced by an earlier run; don't fetch them again
+    dates = []
+    for date in sleep_dates():
+        if ledger and ledger.get("sleep", date.strftime("%Y-%m-%d")):
+            print(f"ℹ️ Sleep for {date.strftime('%Y-%m-%d')} already synced")
+            plan.noop(date.strftime("%Y-%m-%d"))
+        else:
+            dates.append(date)
+    if not dates:
+        if dry:
+            plan.report()
+        return 0
+
+    first, last = dates[0].strftime("%Y-%m-%d"), dates[-1].strftime("%Y-%m-%d")
+    # A backfill looks up all existing pages at once; a single day uses sleep_data_exists
+    existing_pages = sleep_pages_in_range(client, database_id, first, last) if len(dates) > 1 else None
+
+    with ThreadPoolExecutor(max_workers=SLEEP_FETCH_WORKERS) as pool:
+        # Range-capable data is fetched once for all days
+        weights = pool.submit(get_weights, garmin, first, last)
+
+        # Per-day data is fetched a few days ahead of the day being planned
+        pending = deque()
+        for date in dates:
+            pending.append((date, fetch_day(pool, garmin, date)))
+            if len(pending) > SLEEP_DAYS_AHEAD:
+                sync_day(client, plan, ledger, database_id, *pending.popleft(), weights, existing_pages, store)
+                if not dry and len(plan.pending) >= SLEEP_APPLY_BATCH:
+                    plan.apply(writer)
+        while pending:
+            sync_day(client, plan, ledger, database_id, *pending.popleft(), weights, existing_pages, store)
+
+    if dry:
+        plan.report()
+    else:
+        plan.apply(writer)
+    # The number of days that needed a write
+    return plan.writes()
+
+def main():
+    garmin = get_garmin(os.getenv("GARMIN_EMAIL"), os.getenv("GARMIN_PASSWORD"))
+    database_id = os.getenv("NOTION_SLEEP_DB_ID")
+
+    with SyncLedger() as ledger, AnalyticsStore() as store, NotionWriter(auth=os.getenv("NOTION_TOKEN"), journal=ledger) as writer:
+        client = resilient_notion(Client(auth=os.getenv("NOTION_TOKEN")), limiter=writer)
+        run_sync(garmin, client, writer, ledger, database_id, store)
+
 if __name__ == '__main__':
     main()
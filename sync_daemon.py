@@ -0,0 +1,137 @@
+"""
+Keep syncing Garmin -> Notion in a long-running process.
+
+The daemon logs in once and keeps the Garmin session, the Notion client, the
+writer, the ledger and the analytics store open between polls. Each sync
+polls on its own schedule: after a poll that changed nothing the interval
+grows (up to a maximum), after a change it drops back to the minimum, and a
+new activity also triggers an immediate personal records check. After every round the
+rollups touched by it are updated and the API metrics summary is rewritten.
+
+Usage: python sync_daemon.py
+    SYNC_POLL_MIN_SECONDS / SYNC_POLL_MAX_SECONDS set the activity polling
+    range (default 120 / 1800 seconds).
+"""
+import os
+import signal
+import threading
+import time
+
+from dotenv import load_dotenv
+from garminconnect import GarminConnectAuthenticationError
+from garth.exc import GarthException
+from notion_client import Client
+
+from analytics_store import AnalyticsStore
+from api_metrics import METRICS, instrument_garmin, instrument_notion
+from garmin_session import get_garmin
+from notion_writer import NotionWriter
+from resilience import resilient_notion
+from rollups import run_rollups
+from sync_runner import SYNCS, load_script
+from sync_state import SyncLedger
+
+BACKOFF_FACTOR = 2.0
+
+# Polling range per sync in seconds; the activity range comes from the environment
+POLL_INTERVALS = {
+    "personal records": (6 * 3600, 6 * 3600),
+    "daily steps": (1800, 3 * 3600),
+    "sleep": (1800, 6 * 3600),
+}
+
+
+class Poller:
+    """When a sync is due next, backing off while nothing changes."""
+
+    def __init__(self, name, module, database_id, min_interval, max_interval):
+        self.name = name
+        self.module = module
+        self.database_id = database_id
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.due = 0.0
+
+    def schedule(self, changes, now):
+        if changes:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * BACKOFF_FACTOR)
+        self.due = now + self.interval
+
+
+def build_pollers():
+    activity_interval = (float(os.getenv("SYNC_POLL_MIN_SECONDS", "120")),
+                         float(os.getenv("SYNC_POLL_MAX_SECONDS", "1800")))
+    pollers = []
+    for name, filename, env_var in SYNCS:
+        database_id = os.getenv(env_var)
+        if not database_id:
+            print(f"ℹ️ Skipping {name}: {env_var} is not set")
+            continue
+        min_interval, max_interval = POLL_INTERVALS.get(name, activity_interval)
+        pollers.append(Poller(name, load_script(filename), database_id, min_interval, max_interval))
+    return pollers
+
+
+def main():
+    load_dotenv()
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+
+    garmin = instrument_garmin(get_garmin())
+    notion_token = os.getenv("NOTION_TOKEN")
+    ledger = SyncLedger()
+    store = AnalyticsStore()
+    writer = NotionWriter(auth=notion_token, journal=ledger)
+    client = resilient_notion(instrument_notion(Client(auth=notion_token)), limiter=writer)
+    pollers = build_pollers()
+    by_name = {poller.name: poller for poller in pollers}
+    rollup_db_id = os.getenv("NOTION_ROLLUP_DB_ID")
+
+    try:
+        while pollers and not stop.is_set():
+            now = time.monotonic()
+            for poller in [p for p in pollers if p.due <= now]:
+                try:
+                    changes = poller.module.run_sync(garmin, client, writer, ledger, poller.database_id, store) or 0
+                except (GarminConnectAuthenticationError, GarthException) as e:
+                    # The saved session stopped working; log in again and retry soon
+                    print(f"⚠️ {poller.name}: Garmin session expired ({e}), logging in again")
+                    garmin = instrument_garmin(get_garmin())
+                    changes = 1
+                except Exception as e:
+                    print(f"❌ {poller.name} sync failed: {e}")
+                    changes = 0
+                poller.schedule(changes, time.monotonic())
+                if changes:
+                    print(f"🔄 {poller.name}: {changes} change(s), next poll in {poller.interval:.0f}s")
+                # A new or edited activity may have set a personal record
+                if poller.name == "activities" and changes and "personal records" in by_name:
+                    by_name["personal records"].due = 0.0
+
+            # Only the weeks and months touched by this round are recomputed
+            if rollup_db_id:
+                try:
+                    run_rollups(client, writer, ledger, rollup_db_id, store)
+                except Exception as e:
+                    print(f"❌ rollups failed: {e}")
+
+            writer.finish_run()
+            for error in writer.errors:
+                print(f"❌ Notion write failed: {error}")
+            writer.errors.clear()
+            METRICS.write_summary()
+
+            next_due = min(poller.due for poller in pollers)
+            stop.wait(max(0.0, next_due - time.monotonic()))
+    finally:
+        writer.close(raise_errors=False)
+        store.close()
+        ledger.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Plan/apply split for the sync scripts.
+
+A sync first turns Garmin data and the current Notion state into a SyncPlan:
+an explicit list of create, update, archive and no-op operations. SyncPlan
+has the same create/update/archive interface as NotionWriter, so the
+scripts' write helpers fill it without knowing whether it will be applied.
+With SYNC_DRY_RUN=true the plan is only printed, with the number of writes
+it would cost; otherwise apply() hands it to the writer in bulk. Repeated
+updates of one page are merged into a single request, and operations are
+sent archives first, then updates, then creates. A write that replaces an
+archived page (`replaces=`) is only sent once that archive has succeeded,
+and skipped if it failed, so an archived record is never still current next
+to its replacement.
+"""
+import os
+import threading
+from collections import Counter
+from concurrent.futures import wait
+
+from notion_writer import NOTION_REQUESTS_PER_SECOND
+
+APPLY_ORDER = ("archive", "update", "create")
+
+
+def dry_run():
+    return os.getenv("SYNC_DRY_RUN", "").lower() in ("1", "true", "yes")
+
+
+def request_label(request):
+    # The page title for creates, the page id for updates
+    for prop in request.get("properties", {}).values():
+        if "title" in prop:
+            return "".join(part.get("text", {}).get("content", "") for part in prop["title"])
+    return request.get("page_id", "")
+
+
+class Operation:
+    def __init__(self, action, label, request=None, on_success=None, on_error=None, page=None, replaces=None):
+        self.action = action
+        self.label = label
+        self.request = request
+        self.callbacks = [(on_success, on_error)]
+        self.page = page
+        # The archive operation this write must wait for
+        self.replaces = replaces
+        # [action, label, property names] while the plan is logged for a dry run
+        self.logged = None
+
+    def on_success(self, result):
+        for on_success, _ in self.callbacks:
+            if on_success:
+                on_success(result)
+
+    def on_error(self, error):
+        for _, on_error in self.callbacks:
+            if on_error:
+                on_error(error)
+
+    def handles_errors(self):
+        return any(on_error for _, on_error in self.callbacks)
+
+
+class SyncPlan:
+    """The writes one sync would make, collected before any is sent."""
+
+    def __init__(self, name):
+        self.name = name
+        # Only the number of operations per action is kept for the whole run; the
+        # operations themselves are dropped once applied, so memory stays flat
+        self.action_counts = Counter()
+        # A dry run is never applied: it keeps (action, label, properties) of every
+        # operation for report() instead of the operations
+        self.log = [] if dry_run() else None
+        self.pending = []
+        # page id -> pending update, so repeated updates of a page become one request
+        self.updates = {}
+        # Applied writes still in flight and failed so far; the futures themselves are not kept
+        self.outstanding = 0
+        self.failures = 0
+        self.settled = threading.Condition()
+
+    def create(self, on_success=None, on_error=None, replaces=None, **request):
+        return self._add(Operation("create", request_label(request), request, on_success, on_error, replaces=replaces))
+
+    def update(self, on_success=None, on_error=None, replaces=None, **request):
+        return self._update("update", on_success, on_error, request, replaces)
+
+    def archive(self, on_success=None, on_error=None, **request):
+        # An update that retires a page, e.g. a superseded personal record
+        return self._update("archive", on_success, on_error, request)
+
+    def noop(self, label, on_success=None, page=None):
+        # Already in sync; on_success still runs on apply, e.g. to fill the ledger
+        return self._add(Operation("noop", label, on_success=on_success, page=page))
+
+    def _update(self, action, on_success, on_error, request, replaces=None):
+        queued = self.updates.get(request["page_id"])
+        if queued is not None and queued.action == action:
+            properties = {**queued.request.get("properties", {}), **request.get("properties", {})}
+            queued.request.update(request, properties=properties)
+            queued.callbacks.append((on_success, on_error))
+            queued.replaces = queued.replaces or replaces
+            if self.log is not None:
+                queued.logged[2] = list(properties)
+            return queued
+        operation = self._add(Operation(action, request["page_id"], request, on_success, on_error, replaces=replaces))
+        self.updates[request["page_id"]] = operation
+        return operation
+
+    def _add(self, operation):
+        self.action_counts[operation.action] += 1
+        if self.log is not None and operation.action != "noop":
+            operation.logged = [operation.action, operation.label, list((operation.request or {}).get("properties", {}))]
+            self.log.append(operation.logged)
+        if self.log is None:
+            self.pending.append(operation)
+        return operation
+
+    def counts(self):
+        return Counter(self.action_counts)
+
+    def writes(self):
+        return sum(count for action, count in self.counts().items() if action != "noop")
+
+    def report(self):
+        counts = self.counts()
+        print(f"\n📝 {self.name} plan: " + ", ".join(f"{counts[action]} {action}" for action in APPLY_ORDER + ("noop",)))
+        for action, label, properties in self.log or []:
+            detail = "" if action == "create" else " (" + ", ".join(properties) + ")"
+            print(f"   {action:<8} {label}{detail}")
+        writes = self.writes()
+        print(f"   {writes} Notion writes, about {writes / NOTION_REQUESTS_PER_SECOND:.0f}s at the API rate limit")
+
+    def _finished(self, future):
+        with self.settled:
+            self.outstanding -= 1
+            if future.exception() is not None:
+                self.failures += 1
+            self.settled.notify_all()
+
+    def wait(self):
+        # Block until every applied write finished; True if none of them failed
+        with self.settled:
+            self.settled.wait_for(lambda: self.outstanding == 0)
+            return self.failures == 0
+
+    def apply(self, writer):
+        # Send every pending operation and forget it; returns the number of writes sent
+        pending = self.pending
+        self.pending = []
+        self.updates = {}
+        for operation in pending:
+            if operation.action == "noop":
+                operation.on_success(operation.page)
+
+        writes = [operation for action in APPLY_ORDER for operation in pending if operation.action == action]
+        # Archives and independent writes go first; writes replacing an archived page wait for it
+        archives = {}
+        for operation in writes:
+            if operation.replaces is None:
+                future = self._submit(writer, operation)
+                if operation.action == "archive":
+                    archives[operation] = future
+        wait(archives.values())
+        for operation in writes:
+            if operation.replaces is None:
+                continue
+            error = archives[operation.replaces].exception() if operation.replaces in archives else None
+            if error is None:
+                self._submit(writer, operation)
+                continue
+            print(f"⚠️ Not writing {operation.label}: archiving the page it replaces failed ({error})")
+            with self.settled:
+                self.failures += 1
+            operation.on_error(error)
+        return len(writes)
+
+    def _submit(self, writer, operation):
+        method = "pages.create" if operation.action == "create" else "pages.update"
+        # Without an error handler the writer keeps the error in writer.errors
+        on_error = operation.on_error if operation.handles_errors() else None
+        with self.settled:
+            self.outstanding += 1
+        future = writer.submit(method, operation.on_success, on_error, **operation.request)
+        future.add_done_callback(self._finished)
+        return future
@@ -0,0 +1,159 @@
+"""
+Run every Garmin -> Notion sync in one process.
+
+The sync scripts are loaded as modules and share one Garmin session, one
+Notion client, one rate-limited writer, one ledger and one analytics store
+(see analytics_store.py). The syncs do not
+depend on each other, so they run concurrently; the Notion reads take their
+tokens from the writer's bucket, so reads and writes together stay under
+the API limit. A per-phase timing breakdown
+is printed at the end of the run, and a JSON summary with per-endpoint API
+call metrics is written for monitoring (see api_metrics.py).
+
+Usage: python sync_runner.py
+"""
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (phase name, script, database id variable); syncs without a database id are skipped
+SYNCS = [
+    ("activities", "garmin-activities.py", "NOTION_DB_ID"),
+    ("personal records", "personal-records.py", "NOTION_PR_DB_ID"),
+    ("daily steps", "daily-steps.py", "NOTION_STEPS_DB_ID"),
+    ("sleep", "sleep-data.py", "NOTION_SLEEP_DB_ID"),
+]
+
+
+def load_script(filename):
+    # The scripts have dashes in their names, so they cannot be imported directly
+    name = os.path.splitext(filename)[0].replace("-", "_")
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.timings = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, time.perf_counter() - started))
+
+    def as_dict(self):
+        return {name: round(seconds, 3) for name, seconds in self.timings}
+
+    def report(self, total):
+        print("\n⏱️ Sync timing breakdown:")
+        for name, seconds in self.timings:
+            print(f"   - {name:<24} {seconds:7.2f}s")
+        print(f"   - {'total (wall clock)':<24} {total:7.2f}s")
+
+
+def run_syncs(garmin, client, writer, ledger, timer, syncs=None, store=None):
+
+    # Run the configured syncs concurrently, return the names of the ones that failed
+    jobs = []
+    for name, filename, env_var in syncs or SYNCS:
+        database_id = os.getenv(env_var)
+        if not database_id:
+            print(f"ℹ️ Skipping {name}: {env_var} is not set")
+            continue
+        jobs.append((name, load_script(filename), database_id))
+
+    def run(name, module, database_id):
+        with timer.phase(f"sync: {name}"):
+            module.run_sync(garmin, client, writer, ledger, database_id, store)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as pool:
+        futures = [(name, pool.submit(run, name, module, database_id)) for name, module, database_id in jobs]
+        for name, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ {name} sync failed: {e}")
+                failed.append(name)
+    return failed
+
+
+def main():
+    started = time.perf_counter()
+    timer = PhaseTimer()
+    load_dotenv()
+
+    with timer.phase("imports"):
+        from analytics_store import AnalyticsStore
+        from api_metrics import METRICS, instrument_garmin, instrument_notion
+        from garmin_session import get_garmin
+        from notion_client import Client
+        from notion_writer import NotionWriter
+        from resilience import resilient_notion
+        from rollups import run_rollups
+        from sync_state import SyncLedger
+        for _, filename, _ in SYNCS:
+            load_script(filename)
+
+    with timer.phase("garmin login"):
+        garmin = instrument_garmin(get_garmin())
+
+    notion_token = os.getenv("NOTION_TOKEN")
+    ledger = SyncLedger()
+    store = AnalyticsStore()
+    writer = NotionWriter(auth=notion_token, journal=ledger)
+    client = resilient_notion(instrument_notion(Client(auth=notion_token)), limiter=writer)
+    try:
+        failed = run_syncs(garmin, client, writer, ledger, timer, store=store)
+        # The weekly and monthly summaries need every sync's rows, so they run last
+        rollup_db_id = os.getenv("NOTION_ROLLUP_DB_ID")
+        if rollup_db_id:
+            with timer.phase("rollups"):
+                try:
+                    run_rollups(client, writer, ledger, rollup_db_id, store)
+                except Exception as e:
+                    print(f"❌ rollups failed: {e}")
+                    failed.append("rollups")
+        with timer.phase("pending notion writes"):
+            writer.finish_run()
+    finally:
+        writer.close(raise_errors=False)
+        store.close()
+        ledger.close()
+
+    for error in writer.errors:
+        print(f"❌ Notion write failed: {error}")
+    if writer.errors:
+        failed.append("notion writes")
+
+    timer.report(time.perf_counter() - started)
+    extra = {"phases": timer.as_dict(), "failed": failed}
+    cache = getattr(garmin, "cache", None)
+    if cache is not None:
+        extra["garmin_cache"] = {"hits": cache.hits, "misses": cache.misses}
+        cache.close()
+    path, summary = METRICS.write_summary(extra=extra)
+    totals = summary["totals"]
+    print(f"📊 {totals['count']} API calls, {totals['rate_limited']} rate limited, "
+          f"{totals['errors']} failed; summary written to {path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
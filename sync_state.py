@@ -0,0 +1,162 @@
+"""
+Local sync state shared by the sync scripts.
+
+Everything lives under SYNC_STATE_DIR (default `.sync-state`). The ledger is a
+SQLite table mapping a Garmin record (activityId, or calendar date for steps
+and sleep) to its Notion page id and a hash of the last property payload
+written, so unchanged records are skipped without asking Notion. Callers may
+also store the payload itself to compute partial updates. A small key/value
+table next to it keeps per-sync progress such as high-water marks, and the
+write journal records the Notion writes of the current run that completed, so
+a run restarted after a crash does not send them again. The journal belongs
+to one run and is cleared when that run completes; later runs always send
+the writes they plan.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+
+
+def state_path(*parts):
+    return os.path.join(os.getenv("SYNC_STATE_DIR", ".sync-state"), *parts)
+
+
+def payload_hash(payload):
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SyncLedger:
+    """Garmin record -> (Notion page id, payload hash), keyed by (kind, key)."""
+
+    def __init__(self, path=None):
+        path = path or os.getenv("SYNC_LEDGER_PATH") or state_path("ledger.sqlite3")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Writes complete on the Notion writer thread, so the connection is shared
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ledger (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    page_id TEXT NOT NULL,
+                    payload_hash TEXT NOT NULL,
+                    synced_at TEXT NOT NULL,
+                    payload TEXT,
+                    PRIMARY KEY (kind, key)
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS state (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+            # Entries from before journals were tied to a run cannot be matched to one
+            if "run_id" not in [row[1] for row in self.conn.execute("PRAGMA table_info(journal)")]:
+                self.conn.execute("DROP TABLE IF EXISTS journal")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS journal (
+                    run_id TEXT NOT NULL,
+                    op_id TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    page_id TEXT NOT NULL,
+                    finished_at TEXT NOT NULL,
+                    PRIMARY KEY (run_id, op_id)
+                )
+                """
+            )
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(ledger)")]
+            if "payload" not in columns:
+                self.conn.execute("ALTER TABLE ledger ADD COLUMN payload TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, kind, key):
+        # Return (page_id, payload_hash) or None
+        with self.lock:
+            return self.conn.execute(
+                "SELECT page_id, payload_hash FROM ledger WHERE kind = ? AND key = ?",
+                (kind, str(key)),
+            ).fetchone()
+
+    def last_payload(self, kind, key):
+        # The last written values, if they were recorded, to diff against
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT payload FROM ledger WHERE kind = ? AND key = ?", (kind, str(key))
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def record(self, kind, key, page_id, digest, payload=None):
+        encoded = json.dumps(payload, sort_keys=True, default=str) if payload is not None else None
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ledger (kind, key, page_id, payload_hash, synced_at, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, str(key), page_id, digest, datetime.now(timezone.utc).isoformat(), encoded),
+            )
+
+    def get_state(self, name, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_state(self, name, value):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO state (name, value, updated_at) VALUES (?, ?, ?)",
+                (name, json.dumps(value, sort_keys=True, default=str), datetime.now(timezone.utc).isoformat()),
+            )
+
+    def begin_run(self):
+        # The id of the run that did not complete, so a restart resumes it, or a new one
+        run_id = self.get_state("journal.run")
+        if run_id is None:
+            run_id = uuid.uuid4().hex
+            self.set_state("journal.run", run_id)
+        return run_id
+
+    def end_run(self, run_id):
+        # The run completed: its journal must not answer any later write
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM journal WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM state WHERE name = 'journal.run'")
+
+    def finished_write(self, run_id, op_id):
+        # The page id of a write this run already completed, or None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT page_id FROM journal WHERE run_id = ? AND op_id = ?", (run_id, op_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record_write(self, run_id, op_id, method, page_id):
+        with self.lock, self.conn:
+            if method == "pages.update":
+                # Only the latest update of a page counts; an older payload may be written again later
+                self.conn.execute(
+                    "DELETE FROM journal WHERE run_id = ? AND page_id = ? AND method = ?", (run_id, page_id, method)
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO journal (run_id, op_id, method, page_id, finished_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, op_id, method, page_id, datetime.now(timezone.utc).isoformat()),
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()